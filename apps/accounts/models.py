@@ -53,6 +53,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
     is_email_verified = models.BooleanField(default=False)
 
+    # Signed into calendar feed URLs; changing it revokes the old URL
+    feed_key = models.CharField(max_length=32, blank=True, editable=False)
+
     date_joined = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
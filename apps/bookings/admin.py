@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Booking
+from .models import ArchivedBooking, Booking
 
 
 @admin.register(Booking)
@@ -38,3 +38,25 @@ class BookingAdmin(admin.ModelAdmin):
     def customer_display_name(self, obj):
         return obj.customer_display_name
     customer_display_name.short_description = 'Customer'
+
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'customer_display_name', 'service', 'staff',
+        'date', 'start_time', 'status', 'archived_at'
+    ]
+    list_filter = ['status', 'shop']
+    search_fields = ['customer__email', 'guest_name', 'guest_email']
+    date_hierarchy = 'date'
+    ordering = ['-date', '-start_time']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def customer_display_name(self, obj):
+        return obj.customer_display_name
+    customer_display_name.short_description = 'Customer'
@@ -1,7 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BookingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.bookings'
     verbose_name = 'Bookings'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import restore_fts_triggers
+
+        post_migrate.connect(restore_fts_triggers, sender=self)
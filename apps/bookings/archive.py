@@ -0,0 +1,87 @@
+"""
+Cold storage for historical bookings.
+
+Bookings in a terminal status that are older than BOOKING_ARCHIVE_AFTER_DAYS
+are moved from Booking to ArchivedBooking in batches of bulk_create and
+delete, one transaction per batch. The job keeps no cursor. Each batch
+picks the next eligible rows, and bulk_create ignores rows already copied,
+so an interrupted run simply resumes.
+
+Booking lists merge archived rows in once they reach before the archive
+cutoff (see pagination.paginate).
+"""
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedBooking, Booking
+
+TERMINAL_STATUSES = [
+    Booking.Status.COMPLETED,
+    Booking.Status.CANCELLED,
+    Booking.Status.NO_SHOW,
+]
+
+ARCHIVE_BATCH_SIZE = 1000
+
+# Set while archive_batch deletes the bookings it has copied, so delete
+# receivers can tell archival from a booking going away (see dashboard)
+archiving = ContextVar('archiving', default=False)
+
+# Fields copied from Booking to ArchivedBooking
+ARCHIVED_FIELDS = [field.attname for field in ArchivedBooking._meta.concrete_fields if field.name != 'archived_at']
+
+
+def archive_cutoff():
+    """Return the first date that is never archived."""
+    return timezone.now().date() - timedelta(days=settings.BOOKING_ARCHIVE_AFTER_DAYS)
+
+
+def archive_batch(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move one batch of terminal bookings dated before a date. Returns the count moved."""
+    with transaction.atomic():
+        bookings = list(
+            Booking.objects.filter(date__lt=before, status__in=TERMINAL_STATUSES)
+            .order_by('pk')
+            .select_for_update(skip_locked=True)
+            .values(*ARCHIVED_FIELDS)[:batch_size]
+        )
+        if not bookings:
+            return 0
+        ArchivedBooking.objects.bulk_create(
+            [ArchivedBooking(**values) for values in bookings],
+            ignore_conflicts=True,
+        )
+        token = archiving.set(True)
+        try:
+            Booking.objects.filter(pk__in=[values['id'] for values in bookings]).delete()
+        finally:
+            archiving.reset(token)
+    return len(bookings)
+
+
+def archive_bookings(before=None, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None):
+    """
+    Archive terminal bookings before a date (default and at most
+    archive_cutoff(), since booking lists only read archived rows older
+    than that). Returns the count moved.
+    """
+    before = min(before, archive_cutoff()) if before else archive_cutoff()
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(before, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+    return moved
+
+
+def includes_archive(start_date):
+    """Check whether a range starting at start_date may contain archived bookings."""
+    return start_date is not None and start_date < archive_cutoff()
+
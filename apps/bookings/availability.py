@@ -0,0 +1,410 @@
+"""
+Availability engine for computing bookable time slots.
+
+Working hours and bookings are converted to minute offsets from midnight so a
+staff member's day can be reduced once to a sorted list of free intervals.
+Candidate slots are then produced by a single sweep over those intervals
+instead of testing every slot against every booking.
+"""
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from datetime import time, timedelta
+
+from django.utils import timezone
+
+from apps.shops.schedule import get_shop_schedule
+from apps.staff.models import Staff, StaffService
+
+from . import availability_cache, holds
+from .models import Booking
+
+# Minutes between consecutive slot start times
+SLOT_INTERVAL = 30
+
+# Booking statuses that occupy a staff member's time
+ACTIVE_STATUSES = [Booking.Status.PENDING, Booking.Status.CONFIRMED]
+
+# Days loaded per batch when searching for the next available slot
+NEXT_AVAILABLE_BATCH_DAYS = 7
+
+# Slots for a single date, whether any slot is left at all, and which
+# staff member (by pk) covers each slot value
+DayAvailability = namedtuple(
+    'DayAvailability', ['date', 'slots', 'has_availability', 'staff_by_slot']
+)
+
+# The first free slot found by find_next_available
+NextAvailable = namedtuple('NextAvailable', ['date', 'time', 'display', 'staff_id'])
+
+
+def to_minutes(value):
+    """Convert a time to minutes since midnight."""
+    return value.hour * 60 + value.minute
+
+
+def format_slot(minute):
+    """Return the (value, display) pair used by the slot templates."""
+    hour, minute = divmod(minute, 60)
+    display_hour = hour % 12 or 12
+    period = 'AM' if hour < 12 else 'PM'
+    return f'{hour:02d}:{minute:02d}', f'{display_hour:02d}:{minute:02d} {period}'
+
+
+def free_intervals(lower, upper, loads, capacity=1):
+    """
+    Sweep-line capacity counter over booking start and end events.
+
+    loads is a list of (start, end, weight) intervals. Returns the sorted,
+    non-overlapping (start, end) intervals inside [lower, upper) where the
+    total weight stays below capacity, in O(n log n) for n loads.
+    """
+    events = []
+    for start, end, weight in loads:
+        if end > start:
+            events.append((start, weight))
+            events.append((end, -weight))
+    events.sort()
+
+    free = []
+    load = 0
+    free_since = lower
+    index = 0
+    while index < len(events):
+        position = events[index][0]
+        while index < len(events) and events[index][0] == position:
+            load += events[index][1]
+            index += 1
+        if position <= lower:
+            free_since = lower if load < capacity else None
+            continue
+        if position >= upper:
+            break
+        if load >= capacity and free_since is not None:
+            free.append((free_since, position))
+            free_since = None
+        elif load < capacity and free_since is None:
+            free_since = position
+    if free_since is not None and free_since < upper:
+        free.append((free_since, upper))
+    return free
+
+
+def slot_starts(free, duration, origin, close, step=SLOT_INTERVAL, earliest=None,
+                pad_before=0, pad_after=0):
+    """
+    Sweep the free intervals and return every slot start on the grid
+    origin + k * step between origin and close. The padded footprint
+    [start - pad_before, start + duration + pad_after) must fit in a free
+    interval, while the appointment itself must end by close.
+    """
+    starts = []
+    for start, end in free:
+        lower = max(start + pad_before, origin)
+        if earliest is not None:
+            lower = max(lower, earliest)
+        upper = min(end - pad_after, close)
+        # First grid point at or after the lower bound
+        current = origin + -(-(lower - origin) // step) * step
+        while current + duration <= upper:
+            starts.append(current)
+            current += step
+    return starts
+
+
+def is_interval_free(free, start, end):
+    """Check with a bisect whether [start, end) lies inside one free interval."""
+    index = bisect_right(free, (start, float('inf'))) - 1
+    return index >= 0 and free[index][0] <= start and end <= free[index][1]
+
+
+def daterange(start_date, end_date):
+    """Yield each date from start_date to end_date inclusive."""
+    for offset in range((end_date - start_date).days + 1):
+        yield start_date + timedelta(days=offset)
+
+
+def get_staff_durations(shop, service):
+    """
+    Return {staff_id: duration} for the bookable staff linked to a service
+    through StaffService, ordered by pk. StaffService.custom_duration
+    overrides the service duration where set.
+    """
+    key = availability_cache.qualified_staff_key(shop.pk, service.pk)
+    durations = availability_cache.get_entry(key)
+    if durations is None:
+        rows = StaffService.objects.filter(
+            service=service,
+            staff__shop=shop,
+            staff__is_active=True,
+            staff__accepts_bookings=True,
+        ).order_by('staff_id').values_list('staff_id', 'custom_duration')
+        durations = {
+            staff_id: custom_duration or service.duration
+            for staff_id, custom_duration in rows
+        }
+        availability_cache.set_entry(key, durations)
+    return durations
+
+
+def get_service_duration(shop, service, staff):
+    """Return how long a service takes with a given staff member."""
+    return get_staff_durations(shop, service).get(staff.pk, service.duration)
+
+
+def load_windows(shop, staff_ids, start_date, end_date):
+    """
+    Return {staff_id: {date: (open_minute, close_minute, closure_intervals)}}
+    for every bookable staff/date pair in the range. Hours, closures and
+    time off are read from the shop's compiled schedule without queries.
+    """
+    schedule = get_shop_schedule(shop)
+    windows = {}
+    for staff_id in staff_ids:
+        staff_windows = windows[staff_id] = {}
+        for date in daterange(start_date, end_date):
+            window = schedule.staff_window(staff_id, date)
+            if window is not None:
+                staff_windows[date] = window
+    return windows
+
+
+def active_bookings(staff_ids, start_date, end_date):
+    """Return the active bookings of the given staff in a date range."""
+    return Booking.objects.filter(
+        staff_id__in=staff_ids,
+        date__gte=start_date,
+        date__lte=end_date,
+        status__in=ACTIVE_STATUSES,
+    ).order_by()
+
+
+def load_bookings(staff_ids, start_date, end_date):
+    """
+    Return {(staff_id, date): [(start, end, service_id, buffer_before, buffer_after)]}
+    for the active bookings in the range, in one query.
+    """
+    bookings = active_bookings(staff_ids, start_date, end_date).values_list(
+        'staff_id', 'date', 'start_time', 'end_time',
+        'service_id', 'service__buffer_before', 'service__buffer_after',
+    )
+
+    booked = defaultdict(list)
+    for staff_id, date, start, end, service_id, buffer_before, buffer_after in bookings:
+        booked[staff_id, date].append(
+            (to_minutes(start), to_minutes(end), service_id, buffer_before, buffer_after)
+        )
+    return booked
+
+
+def earliest_start(date):
+    """Return the first bookable minute for a date, or None if not today."""
+    now = timezone.now()
+    if date != now.date():
+        return None
+    # Slots starting at or before the current time are in the past
+    return to_minutes(now.time()) + 1
+
+
+def slot_padding(shop, service):
+    """Return the (before, after) buffer minutes around an appointment."""
+    return service.buffer_before, service.buffer_after + shop.buffer_time
+
+
+def day_loads(shop, service, closed, bookings):
+    """
+    Return the (start, end, weight) loads on a staff member's day.
+
+    Every booking is padded with its service buffers and the shop buffer.
+    Bookings of this service take one place out of max_bookings_per_slot;
+    anything else (other services, partial closures) blocks the staff member.
+    """
+    capacity = max(service.max_bookings_per_slot, 1)
+    loads = [(start, end, capacity) for start, end in closed]
+    for start, end, service_id, buffer_before, buffer_after in bookings:
+        loads.append((
+            start - buffer_before,
+            end + buffer_after + shop.buffer_time,
+            1 if service_id == service.pk else capacity,
+        ))
+    return loads
+
+
+def compute_free_intervals(shop, service, staff_ids, start_date, end_date):
+    """
+    Return {(staff_id, date): (open_minute, close_minute, free_intervals)}
+    for every bookable staff/date pair in the range, straight from the database.
+    """
+    capacity = max(service.max_bookings_per_slot, 1)
+    pad_before, pad_after = slot_padding(shop, service)
+
+    windows = load_windows(shop, staff_ids, start_date, end_date)
+    booked = {}
+    if any(windows.values()):
+        booked = load_bookings(staff_ids, start_date, end_date)
+
+    computed = {}
+    for staff_id, staff_windows in windows.items():
+        for date, (open_minute, close_minute, closed) in staff_windows.items():
+            loads = day_loads(shop, service, closed, booked.get((staff_id, date), []))
+            free = free_intervals(open_minute - pad_before, close_minute + pad_after, loads, capacity)
+            computed[staff_id, date] = (open_minute, close_minute, free)
+    return computed
+
+
+def get_free_intervals(shop, service, staff_durations, dates):
+    """
+    Return {(staff_id, date): (open_minute, close_minute, free_intervals)}
+    for the given staff and dates, served from the availability cache where
+    possible. Staff/date pairs with nothing bookable map to an empty tuple.
+    """
+    keys = availability_cache.free_interval_keys(shop.pk, service.pk, staff_durations, dates)
+    cached = availability_cache.get_many(list(keys.values()))
+    schedules = {pair: cached[key] for pair, key in keys.items() if key in cached}
+
+    missing = [pair for pair in keys if pair not in schedules]
+    if missing:
+        missing_staff = sorted({staff_id for staff_id, _ in missing})
+        missing_dates = [date for _, date in missing]
+        computed = compute_free_intervals(
+            shop, service, missing_staff, min(missing_dates), max(missing_dates)
+        )
+        entries = {}
+        for pair in missing:
+            schedules[pair] = computed.get(pair, ())
+            entries[keys[pair]] = schedules[pair]
+        availability_cache.set_many(entries)
+    return schedules
+
+
+def get_bookable_durations(shop, service, staff=None):
+    """Return {staff_id: duration} for one staff member, or all qualified staff."""
+    staff_durations = get_staff_durations(shop, service)
+    if staff:
+        return {staff.pk: staff_durations.get(staff.pk, service.duration)}
+    return staff_durations
+
+
+def build_day(date, staff_by_minute):
+    """Return the DayAvailability for {slot start minute: covering staff_id}."""
+    slots = []
+    staff_by_slot = {}
+    for minute in sorted(staff_by_minute):
+        slot = format_slot(minute)
+        slots.append(slot)
+        staff_by_slot[slot[0]] = staff_by_minute[minute]
+    return DayAvailability(date, slots, bool(slots), staff_by_slot)
+
+
+def get_available_slots_range(shop, service, staff, start_date, end_date, hold_token=None):
+    """
+    Calculate available slots for every date from start_date to end_date.
+
+    With a staff member, only their calendar is used. Without one, the
+    result is the union of every qualified staff member's free slots, and
+    each slot remembers the first staff member (by pk) who can take it.
+    Each staff member's custom duration, the service and shop buffers and
+    the service's max_bookings_per_slot are all honoured. Slots held by
+    anyone but hold_token (see holds.py) are left out.
+
+    Free intervals come from the availability cache. On a miss, hours,
+    closures and time off come from the compiled shop schedule and the
+    bookings for the whole window are fetched in one query, so the query
+    count does not grow with the number of days or staff members.
+
+    Returns a list of
+    DayAvailability(date, slots, has_availability, staff_by_slot).
+    """
+    staff_durations = get_bookable_durations(shop, service, staff)
+    pad_before, pad_after = slot_padding(shop, service)
+    dates = list(daterange(start_date, end_date))
+    schedules = get_free_intervals(shop, service, staff_durations, dates)
+    held = holds.get_held_blocks(staff_durations, dates, hold_token)
+
+    days = []
+    for date in dates:
+        earliest = earliest_start(date)
+        staff_by_minute = {}
+        for staff_id, duration in staff_durations.items():
+            schedule = schedules[staff_id, date]
+            if not schedule:
+                continue
+            open_minute, close_minute, free = schedule
+            starts = slot_starts(
+                free, duration, origin=open_minute, close=close_minute, earliest=earliest,
+                pad_before=pad_before, pad_after=pad_after,
+            )
+            held_blocks = held.get((staff_id, date))
+            for minute in starts:
+                if held_blocks and holds.is_held(held_blocks, minute - pad_before, minute + duration + pad_after):
+                    continue
+                staff_by_minute.setdefault(minute, staff_id)
+        days.append(build_day(date, staff_by_minute))
+    return days
+
+
+def is_slot_available(shop, service, staff, date, start_time):
+    """
+    Check whether a staff member can still take a slot. Used to re-validate
+    a slot inside the booking transaction, so bookings are read straight
+    from the database rather than the free-interval cache. Hours, closures,
+    time off and durations still come from the cached shop schedule and
+    staff durations, which are invalidated when those rows change.
+    """
+    duration = get_service_duration(shop, service, staff)
+    pad_before, pad_after = slot_padding(shop, service)
+    schedule = compute_free_intervals(shop, service, [staff.pk], date, date).get((staff.pk, date))
+    if not schedule:
+        return False
+    open_minute, close_minute, free = schedule
+    starts = slot_starts(
+        free, duration, origin=open_minute, close=close_minute, earliest=earliest_start(date),
+        pad_before=pad_before, pad_after=pad_after,
+    )
+    return to_minutes(start_time) in starts
+
+
+def get_available_slots(shop, service, staff, date, hold_token=None):
+    """
+    Calculate available time slots for a given service, staff, and date.
+    Returns a list of (value, display) tuples, e.g. ('09:30', '09:30 AM').
+    """
+    return get_available_slots_range(shop, service, staff, date, date, hold_token)[0].slots
+
+
+def find_available_staff(shop, service, date, time, hold_token=None):
+    """
+    Return the staff member who covers a slot in "any staff" mode,
+    or None if no qualified staff member is free at that time.
+    """
+    day = get_available_slots_range(shop, service, None, date, date, hold_token)[0]
+    staff_id = day.staff_by_slot.get(time.strftime('%H:%M'))
+    if staff_id is None:
+        return None
+    return Staff.objects.select_related('user').get(pk=staff_id)
+
+
+def find_next_available(shop, service, staff=None, after=None, hold_token=None):
+    """
+    Return the first NextAvailable slot starting after an aware datetime
+    (default now), or None if nothing is free within max_advance_booking_days.
+
+    Days are loaded in batches of NEXT_AVAILABLE_BATCH_DAYS through
+    get_available_slots_range, and the search stops at the first batch
+    containing a slot.
+    """
+    now = timezone.now()
+    after = max(after or now, now)
+    last_date = now.date() + timedelta(days=shop.max_advance_booking_days)
+
+    batch_start = after.date()
+    while batch_start <= last_date:
+        batch_end = min(batch_start + timedelta(days=NEXT_AVAILABLE_BATCH_DAYS - 1), last_date)
+        days = get_available_slots_range(shop, service, staff, batch_start, batch_end, hold_token)
+        for day in days:
+            for value, display in day.slots:
+                slot_time = time(*map(int, value.split(':')))
+                if day.date == after.date() and slot_time <= after.time():
+                    continue
+                return NextAvailable(day.date, slot_time, display, day.staff_by_slot[value])
+        batch_start = batch_end + timedelta(days=1)
+    return None
@@ -0,0 +1,153 @@
+"""
+Django cache layer for computed availability.
+
+Free intervals are cached per (staff, date, service, duration). Entries are
+never deleted directly. Instead every key embeds version stamps, and the
+signal handlers in signals.py bump the narrowest version that a write can
+affect:
+
+- shop version: business hours, closures, services and staff assignments
+- staff version: a staff member's working hours and time off
+- day version: the bookings of one staff member on one date
+
+A bumped version makes the old entries unreachable. They then age out
+through the cache TTL.
+"""
+import time
+
+from django.core.cache import cache
+
+# How long computed availability stays cached (seconds)
+AVAILABILITY_CACHE_TIMEOUT = 60 * 60
+
+# Version stamps outlive the entries that embed them
+VERSION_TIMEOUT = AVAILABILITY_CACHE_TIMEOUT * 24
+
+HITS_KEY = 'availability:stats:hits'
+MISSES_KEY = 'availability:stats:misses'
+
+
+def shop_version_key(shop_id):
+    return f'availability:version:shop:{shop_id}'
+
+
+def staff_version_key(staff_id):
+    return f'availability:version:staff:{staff_id}'
+
+
+def day_version_key(staff_id, date):
+    return f'availability:version:day:{staff_id}:{date.isoformat()}'
+
+
+def _new_version():
+    # Time-based so an evicted version never restarts at a previously used value
+    return time.time_ns()
+
+
+def get_versions(keys):
+    """Return {key: version} for the given version keys, initialising missing ones."""
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, VERSION_TIMEOUT)
+        versions.update(cache.get_many(list(missing)))
+    return versions
+
+
+def bump_version(key):
+    """Invalidate every entry that embeds this version key."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), VERSION_TIMEOUT)
+
+
+def bump_shop_version(shop_id):
+    bump_version(shop_version_key(shop_id))
+
+
+def bump_staff_version(staff_id):
+    bump_version(staff_version_key(staff_id))
+
+
+def bump_day_version(staff_id, date):
+    bump_version(day_version_key(staff_id, date))
+
+
+def free_interval_keys(shop_id, service_id, staff_durations, dates):
+    """
+    Return {(staff_id, date): cache_key} for every staff/date pair.
+    staff_durations maps each staff id to their duration for the service.
+    """
+    staff_ids = list(staff_durations)
+    version_keys = [shop_version_key(shop_id)]
+    version_keys += [staff_version_key(staff_id) for staff_id in staff_ids]
+    version_keys += [day_version_key(staff_id, date) for staff_id in staff_ids for date in dates]
+    versions = get_versions(version_keys)
+
+    shop_version = versions[shop_version_key(shop_id)]
+    keys = {}
+    for staff_id in staff_ids:
+        staff_version = versions[staff_version_key(staff_id)]
+        for date in dates:
+            day_version = versions[day_version_key(staff_id, date)]
+            keys[staff_id, date] = (
+                f'availability:free:{shop_id}.{shop_version}:{staff_id}.{staff_version}:'
+                f'{date.isoformat()}.{day_version}:{service_id}:{staff_durations[staff_id]}'
+            )
+    return keys
+
+
+def qualified_staff_key(shop_id, service_id):
+    """Return the key caching the qualified staff and their durations for a service."""
+    shop_version = get_versions([shop_version_key(shop_id)])[shop_version_key(shop_id)]
+    return f'availability:staff:{shop_id}.{shop_version}:{service_id}'
+
+
+def get_entry(key):
+    return cache.get(key)
+
+
+def set_entry(key, value):
+    cache.set(key, value, AVAILABILITY_CACHE_TIMEOUT)
+
+
+def get_many(keys):
+    """Fetch cached entries and record hits and misses."""
+    found = cache.get_many(keys)
+    record(hits=len(found), misses=len(keys) - len(found))
+    return found
+
+
+def set_many(entries):
+    cache.set_many(entries, AVAILABILITY_CACHE_TIMEOUT)
+
+
+def record(hits=0, misses=0):
+    """Add to the hit/miss counters."""
+    for key, amount in ((HITS_KEY, hits), (MISSES_KEY, misses)):
+        if not amount:
+            continue
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            cache.set(key, amount, None)
+
+
+def get_stats():
+    """Return hit/miss counters and the hit rate for cached availability."""
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
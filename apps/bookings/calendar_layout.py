@@ -0,0 +1,213 @@
+"""
+Staff-column day and week calendar for shop owners.
+
+build_calendar() reads everything a window needs in a fixed number of
+queries, however many staff and bookings it shows:
+
+- the shop's active staff
+- the window's bookings, as one range query on the indexed starts_at and
+  ends_at (see migration 0004)
+- the window's closures and staff time off
+- weekly business and staff hours, from the compiled ShopSchedule
+
+It then lays each staff-day out server-side. Overlapping bookings are
+packed into side-by-side lanes, and every card gets its position as a
+percentage of the day's time axis, so templates only place boxes.
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from apps.shops.models import ShopClosure
+from apps.shops.schedule import DAY_OFF, get_shop_schedule
+from apps.staff.models import StaffTimeOff
+
+from .models import Booking
+
+CALENDAR_VIEWS = {'day': 1, 'week': 7}
+
+# Time axis shown when the window has no opening hours at all
+DEFAULT_DAY_START = 9 * 60
+DEFAULT_DAY_END = 17 * 60
+
+MINUTES_PER_DAY = 24 * 60
+
+# Pixels per hour of a day's time axis
+HOUR_HEIGHT = 48
+
+Card = namedtuple('Card', ['booking', 'start', 'end', 'lane', 'lanes', 'top', 'height', 'left', 'width'])
+Block = namedtuple('Block', ['label', 'top', 'height'])
+StaffDay = namedtuple('StaffDay', ['staff', 'is_off', 'blocks', 'cards'])
+CalendarDay = namedtuple('CalendarDay', ['date', 'is_closed', 'columns'])
+Calendar = namedtuple('Calendar', ['view', 'start', 'end', 'days', 'staff', 'hours', 'height'])
+
+
+def week_start(date):
+    return date - timedelta(days=date.weekday())
+
+
+def window_start(view, date):
+    """Return the first date shown by a day or week view containing date."""
+    return week_start(date) if view == 'week' else date
+
+
+def pack_intervals(intervals):
+    """
+    Assign lanes to (start, end, item) intervals so overlapping ones sit
+    side by side. Returns [(start, end, item, lane, lanes)], where lanes is
+    the width of the group of overlapping intervals the item belongs to.
+    """
+    packed = []
+    group = []
+    lane_ends = []
+    group_end = None
+
+    def close_group():
+        packed.extend((start, end, item, lane, len(lane_ends)) for start, end, item, lane in group)
+
+    for start, end, item in sorted(intervals, key=lambda interval: (interval[0], interval[1])):
+        if group and start >= group_end:
+            close_group()
+            group, lane_ends = [], []
+        for lane, lane_end in enumerate(lane_ends):
+            if lane_end <= start:
+                lane_ends[lane] = end
+                break
+        else:
+            lane = len(lane_ends)
+            lane_ends.append(end)
+        group.append((start, end, item, lane))
+        group_end = end if len(group) == 1 else max(group_end, end)
+    if group:
+        close_group()
+    return packed
+
+
+def minute_of(value, date):
+    """Minutes from midnight of date to an aware datetime, clipped to the day."""
+    local = timezone.localtime(value)
+    minutes = (local.date() - date).days * MINUTES_PER_DAY + local.hour * 60 + local.minute
+    return max(0, min(minutes, MINUTES_PER_DAY))
+
+
+def percent(minutes, day_start, day_end):
+    return round(100 * (minutes - day_start) / (day_end - day_start), 3)
+
+
+def staff_hours(schedule, staff_id, date):
+    """Return a staff member's (open, close) minutes from the weekly hours, or None."""
+    hours = schedule.business_hours[date.weekday()]
+    if hours is None:
+        return None
+    working = schedule.staff_hours.get(staff_id, (None,) * 7)[date.weekday()]
+    if working == DAY_OFF:
+        return None
+    if working is None:
+        return hours
+    return (
+        working[0] if working[0] is not None else hours[0],
+        working[1] if working[1] is not None else hours[1],
+    )
+
+
+def build_calendar(shop, view, date):
+    """Return the Calendar of a shop for the day or week view containing date."""
+    start = window_start(view, date)
+    days = [start + timedelta(days=offset) for offset in range(CALENDAR_VIEWS[view])]
+    end = days[-1]
+
+    staff = list(shop.staff_members.filter(is_active=True).select_related('user').order_by('pk'))
+    schedule = get_shop_schedule(shop)
+
+    # The window's bookings, closures and time off, one query each
+    window_from = timezone.make_aware(datetime.combine(start, time.min))
+    window_to = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    bookings = (
+        Booking.objects.filter(shop=shop, starts_at__lt=window_to, ends_at__gt=window_from)
+        .exclude(status=Booking.Status.CANCELLED)
+        .select_related('service', 'customer')
+    )
+    closures = ShopClosure.objects.filter(shop=shop, date__gte=start, date__lte=end)
+    time_off = StaffTimeOff.objects.filter(
+        staff__shop=shop,
+        start_date__lte=end,
+        end_date__gte=start,
+    ).values_list('staff_id', 'start_date', 'end_date')
+
+    bookings_by_day = defaultdict(list)
+    for booking in bookings:
+        booking_start, booking_end = booking.get_period()
+        for day in days:
+            first, last = minute_of(booking_start, day), minute_of(booking_end, day)
+            if first < last:
+                bookings_by_day[booking.staff_id, day].append((first, last, booking))
+
+    closed_dates = set()
+    closure_blocks = defaultdict(list)
+    for closure in closures:
+        if closure.is_full_day or not closure.start_time or not closure.end_time:
+            closed_dates.add(closure.date)
+        else:
+            closure_blocks[closure.date].append((
+                closure.start_time.hour * 60 + closure.start_time.minute,
+                closure.end_time.hour * 60 + closure.end_time.minute,
+                closure.reason or 'Closed',
+            ))
+
+    away = defaultdict(set)
+    for staff_id, first, last in time_off:
+        for day in days:
+            if first <= day <= last:
+                away[staff_id].add(day)
+
+    # One time axis for the whole window, covering every opening and booking
+    bounds = [(first, last) for entries in bookings_by_day.values() for first, last, _ in entries]
+    for day in days:
+        bounds.append(schedule.business_hours[day.weekday()])
+        bounds += [staff_hours(schedule, member.pk, day) for member in staff]
+    bounds = [hours for hours in bounds if hours]
+    day_start = min((first for first, _ in bounds), default=DEFAULT_DAY_START) // 60 * 60
+    day_end = -(-max((last for _, last in bounds), default=DEFAULT_DAY_END) // 60) * 60
+    if day_end <= day_start:
+        day_start, day_end = DEFAULT_DAY_START, DEFAULT_DAY_END
+
+    def block(first, last, label):
+        top = percent(max(first, day_start), day_start, day_end)
+        return Block(label, top, percent(min(last, day_end), day_start, day_end) - top)
+
+    calendar_days = []
+    for day in days:
+        is_closed = day in closed_dates or schedule.business_hours[day.weekday()] is None
+        columns = []
+        for member in staff:
+            hours = None if is_closed or day in away[member.pk] else staff_hours(schedule, member.pk, day)
+            blocks = []
+            if hours is None:
+                blocks.append(block(day_start, day_end, 'Closed' if is_closed else 'Off'))
+            else:
+                if hours[0] > day_start:
+                    blocks.append(block(day_start, hours[0], ''))
+                if hours[1] < day_end:
+                    blocks.append(block(hours[1], day_end, ''))
+                blocks += [block(*closure) for closure in closure_blocks.get(day, ())]
+
+            cards = []
+            for first, last, booking, lane, lanes in pack_intervals(bookings_by_day.get((member.pk, day), [])):
+                top = percent(max(first, day_start), day_start, day_end)
+                cards.append(Card(
+                    booking, first, last, lane, lanes,
+                    top=top,
+                    height=percent(min(last, day_end), day_start, day_end) - top,
+                    left=round(100 * lane / lanes, 3),
+                    width=round(100 / lanes, 3),
+                ))
+            columns.append(StaffDay(member, hours is None, blocks, cards))
+        calendar_days.append(CalendarDay(day, is_closed, columns))
+
+    hour_marks = [
+        (time(minute // 60), percent(minute, day_start, day_end))
+        for minute in range(day_start, day_end, 60)
+    ]
+    height = (day_end - day_start) * HOUR_HEIGHT // 60
+    return Calendar(view, start, end, calendar_days, staff, hour_marks, height)
@@ -0,0 +1,175 @@
+"""
+iCalendar subscription feeds for staff members and customers.
+
+Feed URLs carry a signed token naming the staff member or customer and
+their feed_key, so they can be added to calendar apps that cannot log in,
+and a leaked URL is revoked by resetting the key. Calendar apps poll these
+URLs every few minutes, so each feed has an ETag built from one aggregate
+query (latest updated_at of the bookings in its window and of their shops,
+services and customers, and the row count). Unchanged polls get a 304 Not
+Modified without loading any bookings, and rendered bodies are cached
+under their ETag.
+"""
+import hashlib
+import secrets
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Booking
+
+FEED_SALT = 'bookings.feed'
+
+FEED_KINDS = ('staff', 'customer')
+
+# Window of bookings included in a feed, in days around today
+FEED_PAST_DAYS = 30
+FEED_FUTURE_DAYS = 180
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+EVENT_STATUSES = {
+    Booking.Status.PENDING: 'TENTATIVE',
+    Booking.Status.CANCELLED: 'CANCELLED',
+}
+
+
+def make_token(kind, owner):
+    # Unlike signing.dumps, no timestamp, so a feed's URL only changes with its key
+    payload = [kind, owner.pk, owner.feed_key] if owner.feed_key else [kind, owner.pk]
+    return signing.Signer(salt=FEED_SALT).sign_object(payload)
+
+
+def read_token(token):
+    """Return (kind, pk, feed key) of a feed token, or None if it is invalid."""
+    try:
+        kind, pk, *key = signing.Signer(salt=FEED_SALT).unsign_object(token)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if kind not in FEED_KINDS or not isinstance(pk, int) or len(key) > 1:
+        return None
+    return kind, pk, key[0] if key else ''
+
+
+def feed_url(request, kind, owner):
+    """Return the absolute subscription URL of a staff member's or customer's feed."""
+    return request.build_absolute_uri(reverse('bookings:calendar_feed', args=[make_token(kind, owner)]))
+
+
+def reset_feed_key(owner):
+    """Give a staff member or customer a new feed key, revoking their current feed URL."""
+    owner.feed_key = secrets.token_urlsafe(24)
+    # A plain UPDATE, since the key is nothing availability or the dashboard depend on
+    owner._meta.model.objects.filter(pk=owner.pk).update(feed_key=owner.feed_key)
+
+
+def feed_bookings(kind, pk):
+    """Return the bookings in a feed's date window."""
+    today = timezone.now().date()
+    owner = {'staff_id': pk} if kind == 'staff' else {'customer_id': pk}
+    return Booking.objects.filter(
+        date__gte=today - timedelta(days=FEED_PAST_DAYS),
+        date__lte=today + timedelta(days=FEED_FUTURE_DAYS),
+        **owner,
+    )
+
+
+def feed_etag(kind, pk, name_changed_at):
+    """
+    Return the current ETag of a feed. It changes when a booking in the
+    window is created, changed or deleted, when a shop, service or customer
+    shown in it is edited, and daily as the window moves. name_changed_at
+    is when the feed's own name last changed (the staff member's user or
+    shop, or the customer).
+    """
+    state = feed_bookings(kind, pk).order_by().aggregate(
+        latest=Max('updated_at'),
+        shop=Max('shop__updated_at'),
+        service=Max('service__updated_at'),
+        customer=Max('customer__updated_at'),
+        count=Count('pk'),
+    )
+    stamps = [state['latest'], state['shop'], state['service'], state['customer'], *name_changed_at]
+    stamps = ':'.join(stamp.isoformat() if stamp else '' for stamp in stamps)
+    key = f'{kind}:{pk}:{timezone.now().date()}:{stamps}:{state["count"]}'
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def escape_text(value):
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Fold a content line at 75 octets, as RFC 5545 requires."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        # Never split a multi-byte character
+        cut = min(len(encoded), 75 if not parts else 74)
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts)
+
+
+def format_utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def render_event(booking, kind):
+    start, end = booking.get_period()
+    if kind == 'staff':
+        summary = f'{booking.service.name} - {booking.customer_display_name}'
+    else:
+        summary = f'{booking.service.name} at {booking.shop.name}'
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:booking-{booking.pk}@appointhub',
+        f'DTSTAMP:{format_utc(booking.updated_at)}',
+        f'LAST-MODIFIED:{format_utc(booking.updated_at)}',
+        f'DTSTART:{format_utc(start)}',
+        f'DTEND:{format_utc(end)}',
+        f'SUMMARY:{escape_text(summary)}',
+        f'STATUS:{EVENT_STATUSES.get(booking.status, "CONFIRMED")}',
+    ]
+    if booking.shop.address:
+        lines.append(f'LOCATION:{escape_text(booking.shop.address)}')
+    if kind == 'staff' and booking.notes:
+        lines.append(f'DESCRIPTION:{escape_text(booking.notes)}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def render_feed(kind, pk, name):
+    bookings = feed_bookings(kind, pk).select_related('shop', 'service', 'customer').order_by('date', 'start_time')
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//AppointHub//Bookings//EN',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ]
+    for booking in bookings:
+        lines += render_event(booking, kind)
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold(line) for line in lines) + '\r\n'
+
+
+def get_feed(kind, pk, name, etag):
+    """Return the rendered feed for an ETag, from the cache when possible."""
+    key = f'bookings:feed:{etag}'
+    body = cache.get(key)
+    if body is None:
+        body = render_feed(kind, pk, name)
+        cache.set(key, body, FEED_CACHE_TIMEOUT)
+    return body
@@ -4,9 +4,11 @@ from django import forms
 from django.utils import timezone
 
 from apps.services.models import Service
-from apps.staff.models import Staff, StaffWorkingHours, StaffTimeOff
+from apps.staff.models import Staff
 
+from . import availability
 from .models import Booking
+from .services import create_booking
 
 
 class BookingForm(forms.Form):
@@ -111,17 +113,32 @@ class ManualBookingForm(forms.ModelForm):
         booking = super().save(commit=False)
         booking.shop = self.shop
 
-        # Calculate end time based on service duration
+        # Calculate end time based on the staff member's service duration
         service = booking.service
+        duration = availability.get_service_duration(self.shop, service, booking.staff)
         start_dt = datetime.combine(booking.date, booking.start_time)
-        end_dt = start_dt + timedelta(minutes=service.duration)
+        end_dt = start_dt + timedelta(minutes=duration)
         booking.end_time = end_dt.time()
 
         # Set price from service
         booking.price = service.price
 
         if commit:
-            booking.save()
+            # Walk-ins may fall outside working hours, so only conflicts are checked
+            booking = create_booking(
+                self.shop,
+                service,
+                booking.staff,
+                booking.date,
+                booking.start_time,
+                check_schedule=False,
+                status=booking.status,
+                guest_name=booking.guest_name,
+                guest_email=booking.guest_email,
+                guest_phone=booking.guest_phone,
+                notes=booking.notes,
+            )
+            self.instance = booking
         return booking
 
 
@@ -143,98 +160,11 @@ class BookingStatusForm(forms.Form):
     status = forms.ChoiceField(choices=Booking.Status.choices)
 
 
-def get_available_slots(shop, service, staff, date):
+def get_available_slots(shop, service, staff, date, hold_token=None):
     """
     Calculate available time slots for a given service, staff, and date.
-    Returns a list of (start_time, end_time) tuples.
+    Returns a list of (start_time, display) tuples.
+
+    Thin wrapper around the interval-based availability engine.
     """
-    slots = []
-
-    # Get shop business hours for this day
-    day_of_week = date.weekday()
-    try:
-        shop_hours = shop.business_hours.get(day_of_week=day_of_week)
-        if shop_hours.is_closed:
-            return slots
-    except:
-        return slots
-
-    # If specific staff requested, check their hours
-    if staff:
-        try:
-            staff_hours = staff.working_hours.get(day_of_week=day_of_week)
-            if staff_hours.is_day_off:
-                return slots
-            open_time = staff_hours.start_time or shop_hours.open_time
-            close_time = staff_hours.end_time or shop_hours.close_time
-        except StaffWorkingHours.DoesNotExist:
-            open_time = shop_hours.open_time
-            close_time = shop_hours.close_time
-
-        # Check for time off
-        time_off = StaffTimeOff.objects.filter(
-            staff=staff,
-            start_date__lte=date,
-            end_date__gte=date,
-        ).exists()
-        if time_off:
-            return slots
-    else:
-        open_time = shop_hours.open_time
-        close_time = shop_hours.close_time
-
-    if not open_time or not close_time:
-        return slots
-
-    # Get service duration
-    duration = timedelta(minutes=service.duration)
-
-    # Generate time slots (every 30 minutes)
-    slot_interval = timedelta(minutes=30)
-    current_time = datetime.combine(date, open_time)
-    end_of_day = datetime.combine(date, close_time)
-
-    # Get existing bookings for this date and staff
-    if staff:
-        existing_bookings = Booking.objects.filter(
-            staff=staff,
-            date=date,
-            status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED],
-        ).values_list('start_time', 'end_time')
-    else:
-        # If no staff specified, get all bookings for the shop
-        existing_bookings = Booking.objects.filter(
-            shop=shop,
-            date=date,
-            status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED],
-        ).values_list('start_time', 'end_time')
-
-    booked_ranges = [(s, e) for s, e in existing_bookings]
-
-    # Check if slot is in the past
-    now = timezone.now()
-    is_today = date == now.date()
-
-    while current_time + duration <= end_of_day:
-        slot_start = current_time.time()
-        slot_end = (current_time + duration).time()
-
-        # Skip if slot is in the past
-        if is_today and slot_start <= now.time():
-            current_time += slot_interval
-            continue
-
-        # Check for conflicts with existing bookings
-        is_available = True
-        for booked_start, booked_end in booked_ranges:
-            # Check if there's any overlap
-            if not (slot_end <= booked_start or slot_start >= booked_end):
-                is_available = False
-                break
-
-        if is_available:
-            slots.append((slot_start.strftime('%H:%M'), f'{slot_start.strftime("%I:%M %p")}'))
-
-        current_time += slot_interval
-
-    return slots
+    return availability.get_available_slots(shop, service, staff, date, hold_token)
@@ -0,0 +1,137 @@
+"""
+Short-lived slot holds kept in the cache.
+
+Opening the confirm step holds the slot for HOLD_TIMEOUT seconds, so other
+customers stop being offered it while the form is filled in. A hold claims
+every HOLD_BLOCK-minute block covered by the padded appointment, one cache
+key per block, using cache.add so that two customers can never claim the
+same block. A token holds at most one slot: placing a new hold releases
+the token's previous one. Holds are released when the booking is created,
+or they expire.
+
+Each staff-day with holds also gets a marker key. Availability lookups read
+the markers first and fetch block keys only for the staff-days that have
+holds, so checking holds never touches the database.
+"""
+import secrets
+
+from django.core.cache import cache
+
+from . import availability
+
+# How long a slot stays held while the customer confirms (seconds)
+HOLD_TIMEOUT = 5 * 60
+
+# Granularity of held time, in minutes
+HOLD_BLOCK = 15
+
+BLOCKS_PER_DAY = 24 * 60 // HOLD_BLOCK
+
+SESSION_KEY = 'slot_hold_token'
+
+
+def marker_key(staff_id, date):
+    return f'availability:hold:day:{staff_id}:{date.isoformat()}'
+
+
+def block_key(staff_id, date, block):
+    return f'availability:hold:{staff_id}:{date.isoformat()}:{block}'
+
+
+def token_key(token):
+    return f'availability:hold:token:{token}'
+
+
+def get_token(request):
+    """Return the hold token identifying this visitor's session."""
+    token = request.session.get(SESSION_KEY)
+    if not token:
+        token = request.session[SESSION_KEY] = secrets.token_urlsafe(16)
+    return token
+
+
+def blocks_between(start, end):
+    """Return the block numbers overlapping [start, end) in minutes."""
+    return range(max(start, 0) // HOLD_BLOCK, min(-(-end // HOLD_BLOCK), BLOCKS_PER_DAY))
+
+
+def slot_footprint(shop, service, staff, date, start_time):
+    """Return the padded [start, end) minutes a slot occupies."""
+    duration = availability.get_service_duration(shop, service, staff)
+    pad_before, pad_after = availability.slot_padding(shop, service)
+    start = availability.to_minutes(start_time)
+    return start - pad_before, start + duration + pad_after
+
+
+def place_hold(shop, service, staff, date, start_time, token):
+    """
+    Hold a slot for a token, releasing the token's previous hold. Returns
+    False if any part of the slot is held by someone else, in which case
+    the previous hold is kept. Holding a slot again with the same token
+    renews it. Group services (max_bookings_per_slot > 1) are never held.
+    """
+    if service.max_bookings_per_slot > 1:
+        return True
+
+    start, end = slot_footprint(shop, service, staff, date, start_time)
+    keys = [block_key(staff.pk, date, block) for block in blocks_between(start, end)]
+    claimed = []
+    for key in keys:
+        if cache.add(key, token, HOLD_TIMEOUT):
+            claimed.append(key)
+        elif cache.get(key) == token:
+            cache.touch(key, HOLD_TIMEOUT)
+        else:
+            cache.delete_many(claimed)
+            return False
+    release_keys(set(cache.get(token_key(token), ())) - set(keys), token)
+    cache.set(token_key(token), keys, HOLD_TIMEOUT)
+    cache.set(marker_key(staff.pk, date), True, HOLD_TIMEOUT)
+    return True
+
+
+def release_keys(keys, token):
+    """Delete the block keys that are held by a token."""
+    if keys:
+        cache.delete_many([key for key, value in cache.get_many(list(keys)).items() if value == token])
+
+
+def release_hold(shop, service, staff, date, start_time, token):
+    """Release the blocks of a slot that are held by a token."""
+    start, end = slot_footprint(shop, service, staff, date, start_time)
+    release_keys([block_key(staff.pk, date, block) for block in blocks_between(start, end)], token)
+    cache.delete(token_key(token))
+
+
+def get_held_blocks(staff_ids, dates, token=None):
+    """
+    Return {(staff_id, date): set of blocks} held by anyone but token,
+    for the staff-days that have holds.
+    """
+    markers = {marker_key(staff_id, date): (staff_id, date) for staff_id in staff_ids for date in dates}
+    held_days = [markers[key] for key in cache.get_many(list(markers))]
+    if not held_days:
+        return {}
+
+    keys = {
+        block_key(staff_id, date, block): (staff_id, date, block)
+        for staff_id, date in held_days
+        for block in range(BLOCKS_PER_DAY)
+    }
+    held = {}
+    for key, value in cache.get_many(list(keys)).items():
+        if value != token:
+            staff_id, date, block = keys[key]
+            held.setdefault((staff_id, date), set()).add(block)
+    return held
+
+
+def is_held(blocks, start, end):
+    """Check whether any held block overlaps [start, end) minutes."""
+    return bool(blocks) and any(block in blocks for block in blocks_between(start, end))
+
+
+def is_slot_held(shop, service, staff, date, start_time, token=None):
+    """Check whether a slot is held by anyone but token."""
+    blocks = get_held_blocks([staff.pk], [date], token).get((staff.pk, date))
+    return is_held(blocks, *slot_footprint(shop, service, staff, date, start_time))
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.bookings import archive
+
+
+class Command(BaseCommand):
+    help = 'Move old completed, cancelled and no-show bookings to ArchivedBooking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Archive bookings older than this many days (default and minimum: BOOKING_ARCHIVE_AFTER_DAYS).',
+        )
+        parser.add_argument('--batch-size', type=int, default=archive.ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches.')
+
+    def handle(self, *args, **options):
+        before = None
+        if options['days'] is not None:
+            # Booking lists only read ArchivedBooking before archive_cutoff()
+            if options['days'] < settings.BOOKING_ARCHIVE_AFTER_DAYS:
+                raise CommandError(f'--days must be at least {settings.BOOKING_ARCHIVE_AFTER_DAYS}.')
+            before = timezone.now().date() - timedelta(days=options['days'])
+        moved = archive.archive_bookings(
+            before=before,
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} bookings.'))
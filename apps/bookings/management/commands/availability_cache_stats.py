@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.bookings import availability_cache
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters for the availability cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them.',
+        )
+
+    def handle(self, *args, **options):
+        stats = availability_cache.get_stats()
+        self.stdout.write(f"Hits:     {stats['hits']}")
+        self.stdout.write(f"Misses:   {stats['misses']}")
+        self.stdout.write(f"Hit rate: {stats['hit_rate']:.1%}")
+
+        if options['reset']:
+            availability_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,132 @@
+import random
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.bookings.archive import TERMINAL_STATUSES
+from apps.bookings.availability import ACTIVE_STATUSES, active_bookings
+from apps.bookings.models import Booking
+from apps.bookings.search import matching
+from apps.shops.models import Shop
+
+FIRST_NAMES = ['Anna', 'Ben', 'Chloe', 'David', 'Emma', 'Lucas', 'Mia', 'Noah']
+LAST_NAMES = ['Brown', 'Garcia', 'Jones', 'Miller', 'Smith', 'Taylor', 'Wilson']
+
+
+class Command(BaseCommand):
+    help = 'Print the query plans of the hot booking queries, optionally against seeded rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shop', help='Slug of the shop to query (default: the first shop).')
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Insert this many synthetic bookings first; they are rolled back afterwards.',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run EXPLAIN ANALYZE (PostgreSQL only).',
+        )
+
+    def handle(self, *args, **options):
+        shops = Shop.objects.order_by('pk')
+        shop = shops.filter(slug=options['shop']).first() if options['shop'] else shops.first()
+        if shop is None:
+            raise CommandError('No shop found.')
+
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(shop, options['seed'])
+            self.explain_all(shop, options['analyze'] and connection.vendor == 'postgresql')
+            # Never keep the synthetic rows
+            transaction.set_rollback(True)
+
+    def seed(self, shop, count):
+        staff_ids = list(shop.staff_members.values_list('pk', flat=True))
+        services = list(shop.services.all())
+        if not staff_ids or not services:
+            raise CommandError('The shop needs at least one staff member and one service to seed.')
+
+        rng = random.Random(0)
+        today = timezone.now().date()
+        taken = defaultdict(list)
+        batch = []
+        for _ in range(count):
+            service = rng.choice(services)
+            staff_id = rng.choice(staff_ids)
+            day = today + timedelta(days=rng.randint(-730, 60))
+            start = rng.randrange(8 * 60, 18 * 60, 15)
+            end = start + service.duration
+            # Most bookings end up completed or cancelled. Active ones must not
+            # overlap, as the exclusion constraints on PostgreSQL reject that.
+            status = rng.choice(TERMINAL_STATUSES)
+            if day >= today and rng.random() < 0.7:
+                day_taken = taken[staff_id, day]
+                if not any(start < taken_end and taken_start < end for taken_start, taken_end in day_taken):
+                    day_taken.append((start, end))
+                    status = rng.choice(ACTIVE_STATUSES)
+            booking = Booking(
+                shop=shop,
+                # Most bookings in the wild are guest bookings
+                customer=shop.owner if rng.random() < 0.2 else None,
+                staff_id=staff_id,
+                service=service,
+                date=day,
+                start_time=time(*divmod(start, 60)),
+                end_time=time(*divmod(end % (24 * 60), 60)),
+                status=status,
+                price=service.price,
+                guest_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                guest_email=f'guest{rng.randrange(10000)}@example.com',
+                guest_phone=f'+1 555 {rng.randrange(10000):04d}',
+                is_group=service.max_bookings_per_slot > 1,
+            )
+            # bulk_create skips save(), which fills in these
+            booking.starts_at, booking.ends_at = booking.get_period()
+            booking.search_text = booking.get_search_text()
+            batch.append(booking)
+            if len(batch) == 5000:
+                Booking.objects.bulk_create(batch)
+                batch = []
+        Booking.objects.bulk_create(batch)
+
+        # Refresh planner statistics so the plans reflect the seeded rows
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Booking._meta.db_table}')
+        self.stdout.write(f'Seeded {count} bookings (rolled back at the end).\n')
+
+    def queries(self, shop):
+        today = timezone.now().date()
+        staff_ids = list(shop.staff_members.values_list('pk', flat=True))
+        bookings = Booking.objects.filter(shop=shop)
+        return [
+            ('Availability (get_available_slots)', active_bookings(staff_ids, today, today + timedelta(days=13))),
+            ('Conflict check (create_booking)', Booking.objects.filter(
+                staff_id=staff_ids[0] if staff_ids else None,
+                status__in=ACTIVE_STATUSES,
+            ).overlapping(
+                timezone.make_aware(datetime.combine(today, time(9))),
+                timezone.make_aware(datetime.combine(today, time(10))),
+            ).order_by()[:1]),
+            ('Owner list, upcoming (booking_list_view)',
+             bookings.filter(date__gte=today).order_by('date', 'start_time')[:50]),
+            ('Owner list, past (booking_list_view)',
+             bookings.filter(date__lt=today).order_by('-date', '-start_time')[:50]),
+            ('Owner list by status (booking_list_view)',
+             bookings.filter(status=Booking.Status.CONFIRMED, date__gte=today).order_by('date', 'start_time')[:50]),
+            ('Customer bookings (my_bookings_view)',
+             Booking.objects.filter(customer=shop.owner).order_by('-date', '-start_time')[:50]),
+            ('Search (booking_search_view)',
+             matching(bookings, 'smith').order_by('-date', '-start_time', '-pk')[:20]),
+        ]
+
+    def explain_all(self, shop, analyze):
+        for title, queryset in self.queries(shop):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            plan = queryset.explain(analyze=True) if analyze else queryset.explain()
+            self.stdout.write(plan + '\n')
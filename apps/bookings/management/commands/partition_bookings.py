@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.bookings import partitioning
+
+
+class Command(BaseCommand):
+    help = 'Manage monthly booking partitions on PostgreSQL (requires BOOKING_PARTITIONING).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Rebuild the bookings table as a partitioned table (one-off, locks the table).',
+        )
+
+    def handle(self, *args, **options):
+        if not partitioning.is_enabled():
+            raise CommandError('Booking partitioning needs PostgreSQL and BOOKING_PARTITIONING=True.')
+
+        if options['convert']:
+            if partitioning.is_partitioned():
+                raise CommandError('The bookings table is already partitioned.')
+            partitioning.convert_to_partitioned()
+            self.stdout.write(self.style.SUCCESS('Bookings table converted to monthly partitions.'))
+        elif not partitioning.is_partitioned():
+            raise CommandError('The bookings table is not partitioned yet; run with --convert first.')
+
+        created, detached = partitioning.maintain_partitions()
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        for name in detached:
+            self.stdout.write(f'Detached {name}')
+        if not created and not detached:
+            self.stdout.write('Partitions are up to date.')
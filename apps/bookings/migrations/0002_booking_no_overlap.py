@@ -0,0 +1,63 @@
+from django.db import migrations, models
+
+# Overlapping active bookings for one staff member are rejected unless both
+# are group bookings (max_bookings_per_slot > 1) of the same service:
+# no_overlap rejects different services and no_double_booking rejects any
+# overlap involving a non-group booking. Capacity itself is enforced by
+# services.create_booking.
+PERIOD = """
+tsrange(
+    date + start_time,
+    (CASE WHEN end_time > start_time THEN date ELSE date + 1 END) + end_time,
+    '[)'
+)
+"""
+
+CREATE_CONSTRAINT = f"""
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+ALTER TABLE bookings_booking
+    ADD CONSTRAINT bookings_booking_no_overlap
+    EXCLUDE USING gist (staff_id WITH =, {PERIOD} WITH &&, service_id WITH <>)
+    WHERE (status IN ('pending', 'confirmed'));
+ALTER TABLE bookings_booking
+    ADD CONSTRAINT bookings_booking_no_double_booking
+    EXCLUDE USING gist (staff_id WITH =, {PERIOD} WITH &&)
+    WHERE (status IN ('pending', 'confirmed') AND NOT is_group);
+"""
+
+DROP_CONSTRAINT = """
+ALTER TABLE bookings_booking DROP CONSTRAINT IF EXISTS bookings_booking_no_double_booking;
+ALTER TABLE bookings_booking DROP CONSTRAINT IF EXISTS bookings_booking_no_overlap;
+"""
+
+
+def flag_group_bookings(apps, schema_editor):
+    Booking = apps.get_model("bookings", "Booking")
+    Booking.objects.filter(service__max_bookings_per_slot__gt=1).update(is_group=True)
+
+
+def add_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_CONSTRAINT)
+
+
+def remove_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="is_group",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(flag_group_bookings, migrations.RunPython.noop),
+        migrations.RunPython(add_constraint, remove_constraint),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Availability and conflict checks only read active bookings. SQLite cannot
+# match a partial index against bound status parameters, so the partial
+# index is PostgreSQL-only and the composite index covers other databases.
+CREATE_ACTIVE_INDEX = """
+CREATE INDEX IF NOT EXISTS booking_staff_active_idx
+    ON bookings_booking (staff_id, date, start_time)
+    WHERE status IN ('pending', 'confirmed');
+"""
+
+DROP_ACTIVE_INDEX = """
+DROP INDEX IF EXISTS booking_staff_active_idx;
+"""
+
+
+def add_active_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_ACTIVE_INDEX)
+
+
+def remove_active_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_ACTIVE_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0002_booking_no_overlap"),
+        ("services", "0001_initial"),
+        ("shops", "0002_shop_schedule_version"),
+        ("staff", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["staff", "date", "status"], name="booking_staff_date_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["shop", "date", "start_time"], name="booking_shop_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["shop", "status", "date", "start_time"],
+                name="booking_shop_status_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["customer", "-date", "-start_time"],
+                name="booking_customer_date_idx",
+            ),
+        ),
+        migrations.RunPython(add_active_index, remove_active_index),
+    ]
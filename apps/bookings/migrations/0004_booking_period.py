@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:00
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+# A generated range column for index-backed && overlap queries. Requires the
+# btree_gist extension created in 0002 for the staff_id equality.
+CREATE_PERIOD = """
+ALTER TABLE bookings_booking
+    ADD COLUMN period tstzrange
+    GENERATED ALWAYS AS (tstzrange(starts_at, ends_at, '[)')) STORED;
+CREATE INDEX booking_staff_period_idx ON bookings_booking USING gist (staff_id, period);
+"""
+
+DROP_PERIOD = """
+DROP INDEX IF EXISTS booking_staff_period_idx;
+ALTER TABLE bookings_booking DROP COLUMN IF EXISTS period;
+"""
+
+
+def backfill_period(apps, schema_editor):
+    Booking = apps.get_model("bookings", "Booking")
+    bookings = Booking.objects.filter(starts_at__isnull=True).only(
+        "pk", "date", "start_time", "end_time"
+    )
+    while True:
+        batch = list(bookings[:BATCH_SIZE])
+        if not batch:
+            break
+        for booking in batch:
+            booking.starts_at = timezone.make_aware(
+                datetime.combine(booking.date, booking.start_time)
+            )
+            booking.ends_at = timezone.make_aware(
+                datetime.combine(booking.date, booking.end_time)
+            )
+            if booking.ends_at <= booking.starts_at:
+                booking.ends_at += timedelta(days=1)
+        Booking.objects.bulk_update(batch, ["starts_at", "ends_at"])
+
+
+def add_period(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_PERIOD)
+
+
+def remove_period(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_PERIOD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0003_booking_indexes"),
+        ("services", "0001_initial"),
+        ("shops", "0002_shop_schedule_version"),
+        ("staff", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="ends_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="starts_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["staff", "starts_at"], name="booking_staff_starts_at_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["shop", "starts_at"], name="booking_shop_starts_at_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_period, migrations.RunPython.noop),
+        migrations.RunPython(add_period, remove_period),
+    ]
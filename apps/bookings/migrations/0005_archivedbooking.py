@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:03
+
+import apps.bookings.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0004_booking_period"),
+        ("services", "0001_initial"),
+        ("shops", "0002_shop_schedule_version"),
+        ("staff", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedBooking",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("date", models.DateField()),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("confirmed", "Confirmed"),
+                            ("completed", "Completed"),
+                            ("cancelled", "Cancelled"),
+                            ("no_show", "No Show"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("guest_name", models.CharField(blank=True, max_length=100)),
+                ("guest_email", models.EmailField(blank=True, max_length=254)),
+                ("guest_phone", models.CharField(blank=True, max_length=20)),
+                ("notes", models.TextField(blank=True)),
+                ("cancellation_reason", models.TextField(blank=True)),
+                ("price", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="archived_bookings",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "service",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_bookings",
+                        to="services.service",
+                    ),
+                ),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_bookings",
+                        to="shops.shop",
+                    ),
+                ),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_bookings",
+                        to="staff.staff",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-date", "-start_time"],
+                "indexes": [
+                    models.Index(
+                        fields=["shop", "date", "start_time"],
+                        name="archived_shop_date_idx",
+                    ),
+                    models.Index(
+                        fields=["customer", "-date", "-start_time"],
+                        name="archived_customer_date_idx",
+                    ),
+                ],
+            },
+            bases=(apps.bookings.models.CustomerDetailsMixin, models.Model),
+        ),
+    ]
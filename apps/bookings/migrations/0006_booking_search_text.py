@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:08
+
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Substring and fuzzy search on PostgreSQL: a trigram GIN index serves both
+# LIKE '%term%' and the word-similarity operator <%.
+CREATE_TRGM_INDEX = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX booking_search_trgm_idx
+    ON bookings_booking USING gin (search_text gin_trgm_ops);
+"""
+
+DROP_TRGM_INDEX = """
+DROP INDEX IF EXISTS booking_search_trgm_idx;
+"""
+
+# SQLite fallback for development: an external-content FTS5 table with the
+# trigram tokenizer, kept in sync by triggers. Django rebuilds SQLite tables
+# when altering their columns, which drops the triggers; see
+# search.restore_fts_triggers, which re-creates them after migrate.
+CREATE_FTS = [
+    """
+    CREATE VIRTUAL TABLE bookings_booking_fts USING fts5(
+        search_text, content='bookings_booking', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER bookings_booking_fts_insert AFTER INSERT ON bookings_booking BEGIN
+        INSERT INTO bookings_booking_fts(rowid, search_text) VALUES (new.id, new.search_text);
+    END
+    """,
+    """
+    CREATE TRIGGER bookings_booking_fts_delete AFTER DELETE ON bookings_booking BEGIN
+        INSERT INTO bookings_booking_fts(bookings_booking_fts, rowid, search_text)
+            VALUES ('delete', old.id, old.search_text);
+    END
+    """,
+    """
+    CREATE TRIGGER bookings_booking_fts_update AFTER UPDATE OF search_text ON bookings_booking BEGIN
+        INSERT INTO bookings_booking_fts(bookings_booking_fts, rowid, search_text)
+            VALUES ('delete', old.id, old.search_text);
+        INSERT INTO bookings_booking_fts(rowid, search_text) VALUES (new.id, new.search_text);
+    END
+    """,
+    "INSERT INTO bookings_booking_fts(bookings_booking_fts) VALUES ('rebuild')",
+]
+
+DROP_FTS = [
+    "DROP TRIGGER IF EXISTS bookings_booking_fts_insert",
+    "DROP TRIGGER IF EXISTS bookings_booking_fts_delete",
+    "DROP TRIGGER IF EXISTS bookings_booking_fts_update",
+    "DROP TABLE IF EXISTS bookings_booking_fts",
+]
+
+
+def backfill_search_text(apps, schema_editor):
+    Booking = apps.get_model("bookings", "Booking")
+    bookings = Booking.objects.select_related("customer").order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(bookings.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        for booking in batch:
+            parts = [booking.guest_name, booking.guest_email]
+            phones = [booking.guest_phone]
+            if booking.customer:
+                full_name = f"{booking.customer.first_name} {booking.customer.last_name}"
+                parts += [full_name.strip(), booking.customer.email]
+                phones.append(booking.customer.phone)
+            parts += phones + [re.sub(r"\D", "", phone) for phone in phones]
+            booking.search_text = " ".join(part for part in parts if part).lower()
+        Booking.objects.bulk_update(batch, ["search_text"])
+        last_pk = batch[-1].pk
+
+
+def add_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(CREATE_TRGM_INDEX)
+    elif vendor == "sqlite":
+        for statement in CREATE_FTS:
+            schema_editor.execute(statement)
+
+
+def remove_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(DROP_TRGM_INDEX)
+    elif vendor == "sqlite":
+        for statement in DROP_FTS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0005_archivedbooking"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="search_text",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
@@ -1,13 +1,85 @@
+import re
+from datetime import datetime, timedelta
+
 from django.conf import settings
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from apps.services.models import Service
 from apps.shops.models import Shop
 from apps.staff.models import Staff
 
+# The fields Booking.get_search_text reads
+SEARCH_TEXT_FIELDS = {'customer', 'guest_name', 'guest_email', 'guest_phone'}
+
+
+class BookingQuerySet(models.QuerySet):
+
+    def overlapping(self, start, end):
+        """
+        Bookings whose [starts_at, ends_at) period overlaps [start, end).
+        On PostgreSQL this is a GiST-indexed && on the generated period column.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            table = self.model._meta.db_table
+            return self.filter(RawSQL(
+                f'"{table}"."period" && tstzrange(%s, %s, \'[)\')',
+                (start, end),
+                output_field=models.BooleanField(),
+            ))
+        return self.filter(starts_at__lt=end, ends_at__gt=start)
+
+    def upcoming(self):
+        """Active bookings from today on."""
+        return self.filter(
+            date__gte=timezone.now().date(),
+            status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED],
+        )
+
+    def count_per(self, field):
+        """
+        A subquery counting these bookings per outer row, joined on field
+        (e.g. 'staff'), for use in annotate().
+        """
+        counts = (
+            self.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return Coalesce(Subquery(counts), 0)
 
-class Booking(models.Model):
+
+class CustomerDetailsMixin:
+    """Customer contact details for registered and guest bookings."""
+
+    @property
+    def customer_display_name(self):
+        """Return customer name whether registered or guest."""
+        if self.customer:
+            return self.customer.get_full_name() or self.customer.email
+        return self.guest_name or 'Guest'
+
+    @property
+    def customer_email(self):
+        """Return customer email whether registered or guest."""
+        if self.customer:
+            return self.customer.email
+        return self.guest_email
+
+    @property
+    def customer_phone(self):
+        """Return customer phone whether registered or guest."""
+        if self.customer:
+            return self.customer.phone
+        return self.guest_phone
+
+
+class Booking(CustomerDetailsMixin, models.Model):
     """Model representing a customer booking/appointment."""
 
     class Status(models.TextChoices):
@@ -45,6 +117,17 @@ class Booking(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+    # Denormalized from date, start_time and end_time on save so overlap and
+    # calendar range queries are indexed comparisons. On PostgreSQL these
+    # also feed the generated tstzrange column period (see migration 0004).
+    starts_at = models.DateTimeField(null=True, editable=False)
+    ends_at = models.DateTimeField(null=True, editable=False)
+
+    # Denormalized from service.max_bookings_per_slot > 1 on save. Only group
+    # bookings may overlap another booking of the same staff member, so the
+    # PostgreSQL exclusion constraint exempts them (see migration 0002).
+    is_group = models.BooleanField(default=False, editable=False)
+
     # Status tracking
     status = models.CharField(
         max_length=20,
@@ -67,38 +150,78 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Lowercased customer name, email and phone, maintained on save and when
+    # the customer changes, so search is one indexed column (see search.py)
+    search_text = models.TextField(blank=True, editable=False)
+
+    objects = BookingQuerySet.as_manager()
+
     class Meta:
         ordering = ['date', 'start_time']
+        indexes = [
+            # Availability and conflict checks (PostgreSQL also gets a partial
+            # index on active bookings, see migration 0003)
+            models.Index(fields=['staff', 'date', 'status'], name='booking_staff_date_status_idx'),
+            # Owner booking list, with and without a status filter
+            models.Index(fields=['shop', 'date', 'start_time'], name='booking_shop_date_idx'),
+            models.Index(fields=['shop', 'status', 'date', 'start_time'], name='booking_shop_status_date_idx'),
+            # Customer's own bookings, newest first
+            models.Index(fields=['customer', '-date', '-start_time'], name='booking_customer_date_idx'),
+            # Overlap and calendar range queries
+            models.Index(fields=['staff', 'starts_at'], name='booking_staff_starts_at_idx'),
+            models.Index(fields=['shop', 'starts_at'], name='booking_shop_starts_at_idx'),
+        ]
 
     def __str__(self):
         customer_name = self.customer_display_name
         return f'{customer_name} - {self.service.name} on {self.date} at {self.start_time}'
 
-    @property
-    def customer_display_name(self):
-        """Return customer name whether registered or guest."""
-        if self.customer:
-            return self.customer.get_full_name() or self.customer.email
-        return self.guest_name or 'Guest'
+    def save(self, *args, **kwargs):
+        self.starts_at, self.ends_at = self.get_period()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+        # Reads the customer, so status-only saves skip it
+        if update_fields is None or SEARCH_TEXT_FIELDS & update_fields:
+            self.search_text = self.get_search_text()
+        if update_fields is None or 'service' in update_fields:
+            self.is_group = self.service.max_bookings_per_slot > 1
+        if update_fields is not None:
+            if 'service' in update_fields:
+                update_fields.add('is_group')
+            if {'date', 'start_time', 'end_time'} & update_fields:
+                update_fields |= {'starts_at', 'ends_at'}
+            if SEARCH_TEXT_FIELDS & update_fields:
+                update_fields.add('search_text')
+            kwargs['update_fields'] = update_fields
+        # One transaction with the post_save receivers, so denormalized
+        # totals (the dashboard rollups) commit or roll back with the row
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
 
-    @property
-    def customer_email(self):
-        """Return customer email whether registered or guest."""
+    def get_search_text(self):
+        """Return the searchable customer details, lowercased."""
+        parts = [self.guest_name, self.guest_email]
+        phones = [self.guest_phone]
         if self.customer:
-            return self.customer.email
-        return self.guest_email
+            parts += [self.customer.get_full_name(), self.customer.email]
+            phones.append(self.customer.phone)
+        # Phone digits alone too, so searches match whatever the formatting
+        parts += phones + [re.sub(r'\D', '', phone) for phone in phones]
+        return ' '.join(part for part in parts if part).lower()
 
-    @property
-    def customer_phone(self):
-        """Return customer phone whether registered or guest."""
-        if self.customer:
-            return self.customer.phone
-        return self.guest_phone
+    def get_period(self):
+        """Return the aware (start, end) datetimes, ending on the next day past midnight."""
+        start = timezone.make_aware(datetime.combine(self.date, self.start_time))
+        end = timezone.make_aware(datetime.combine(self.date, self.end_time))
+        if end <= start:
+            end += timedelta(days=1)
+        return start, end
 
     @property
     def is_past(self):
         """Check if booking is in the past."""
-        from datetime import datetime
         booking_datetime = datetime.combine(self.date, self.end_time)
         return timezone.make_aware(booking_datetime) < timezone.now()
 
@@ -136,3 +259,67 @@ class Booking(models.Model):
         if self.status in [self.Status.PENDING, self.Status.CONFIRMED]:
             self.status = self.Status.NO_SHOW
             self.save(update_fields=['status', 'updated_at'])
+
+
+class ArchivedBooking(CustomerDetailsMixin, models.Model):
+    """
+    A past booking in a terminal status, moved out of Booking by the
+    archival job (see archive.py). Keeps the original booking id as its
+    primary key and is read-only from then on.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        related_name='archived_bookings',
+    )
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_bookings',
+    )
+    staff = models.ForeignKey(
+        Staff,
+        on_delete=models.CASCADE,
+        related_name='archived_bookings',
+    )
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.CASCADE,
+        related_name='archived_bookings',
+    )
+
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    status = models.CharField(max_length=20, choices=Booking.Status.choices)
+
+    guest_name = models.CharField(max_length=100, blank=True)
+    guest_email = models.EmailField(blank=True)
+    guest_phone = models.CharField(max_length=20, blank=True)
+
+    notes = models.TextField(blank=True)
+    cancellation_reason = models.TextField(blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # Archived bookings are history only
+    is_archived = True
+    is_upcoming = False
+    can_cancel = False
+
+    class Meta:
+        ordering = ['-date', '-start_time']
+        indexes = [
+            models.Index(fields=['shop', 'date', 'start_time'], name='archived_shop_date_idx'),
+            models.Index(fields=['customer', '-date', '-start_time'], name='archived_customer_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.customer_display_name} - {self.service.name} on {self.date} (archived)'
@@ -0,0 +1,77 @@
+"""
+Keyset pagination for booking lists.
+
+Lists are ordered by (date, start_time, id), ascending or descending, and
+each page continues after the last row of the previous one. The cursor
+encodes that row's key, so every page is one index range scan of
+PAGE_SIZE + 1 rows however deep the list goes, and no COUNT is needed:
+the extra row only tells whether there is a next page.
+"""
+from collections import namedtuple
+from datetime import date, time
+
+from django.db.models import Q
+
+PAGE_SIZE = 25
+
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+
+def encode_cursor(booking):
+    """Return the cursor continuing after a booking."""
+    return f'{booking.date.isoformat()}_{booking.start_time.isoformat()}_{booking.pk}'
+
+
+def decode_cursor(cursor):
+    """Return the (date, start_time, pk) key of a cursor, or None if invalid."""
+    try:
+        day, start_time, pk = cursor.split('_')
+        return date.fromisoformat(day), time.fromisoformat(start_time), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def order_by_key(queryset, descending=False):
+    if descending:
+        return queryset.order_by('-date', '-start_time', '-pk')
+    return queryset.order_by('date', 'start_time', 'pk')
+
+
+def after_key(queryset, key, descending=False):
+    """Filter a queryset to the rows after a (date, start_time, pk) key."""
+    day, start_time, pk = key
+    op = 'lt' if descending else 'gt'
+    return queryset.filter(
+        Q(**{f'date__{op}': day})
+        | Q(date=day, **{f'start_time__{op}': start_time})
+        | Q(date=day, start_time=start_time, **{f'pk__{op}': pk})
+    )
+
+
+def sort_key(booking):
+    return booking.date, booking.start_time, booking.pk
+
+
+def paginate(queryset, cursor=None, descending=False, page_size=PAGE_SIZE, archived=None, archived_before=None):
+    """
+    Return the Page of a booking queryset after cursor.
+
+    archived is an optional queryset of ArchivedBooking rows to merge into a
+    descending list. Every archived row is dated before archived_before, so
+    the archive is only read once a page reaches that date.
+    """
+    key = decode_cursor(cursor) if cursor else None
+    queryset = order_by_key(queryset, descending)
+    if key:
+        queryset = after_key(queryset, key, descending)
+    rows = list(queryset[:page_size + 1])
+
+    if archived is not None and (len(rows) <= page_size or rows[-1].date < archived_before):
+        archived = order_by_key(archived, descending)
+        if key:
+            archived = after_key(archived, key, descending)
+        rows = sorted([*rows, *archived[:page_size + 1]], key=sort_key, reverse=descending)
+
+    items = rows[:page_size]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > page_size else None
+    return Page(items, next_cursor)
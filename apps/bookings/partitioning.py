@@ -0,0 +1,284 @@
+"""
+Opt-in monthly range partitioning of bookings_booking on PostgreSQL.
+
+convert_to_partitioned() rebuilds the table once as a table partitioned by
+date, with one partition per month and a DEFAULT partition catching dates
+no monthly partition covers. maintain_partitions() keeps partitions
+created ahead of time and detaches those older than the retention window
+once their bookings are archived, so history stops weighing on list and
+availability queries without disappearing from them. Both only run with
+BOOKING_PARTITIONING enabled on PostgreSQL.
+
+Every booking query filters on date, so PostgreSQL prunes to the one or
+two monthly partitions covering the requested range.
+
+The primary key becomes (id, date) because it must include the partition
+key. The non-overlap exclusion constraints are created on each partition,
+so they only apply within one month.
+"""
+import logging
+import re
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import archive
+from .models import Booking
+
+logger = logging.getLogger(__name__)
+
+TABLE = Booking._meta.db_table
+UNPARTITIONED_TABLE = f'{TABLE}_unpartitioned'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+# Each partition gets the exclusion constraints of migration 0002:
+# overlapping active bookings of one staff member must be group bookings of
+# the same service.
+EXCLUSION_CONSTRAINTS = {
+    'no_overlap': """
+        EXCLUDE USING gist (
+            staff_id WITH =,
+            tsrange(
+                date + start_time,
+                (CASE WHEN end_time > start_time THEN date ELSE date + 1 END) + end_time,
+                '[)'
+            ) WITH &&,
+            service_id WITH <>
+        )
+        WHERE (status IN ('pending', 'confirmed'))
+    """,
+    'no_double_booking': """
+        EXCLUDE USING gist (
+            staff_id WITH =,
+            tsrange(
+                date + start_time,
+                (CASE WHEN end_time > start_time THEN date ELSE date + 1 END) + end_time,
+                '[)'
+            ) WITH &&
+        )
+        WHERE (status IN ('pending', 'confirmed') AND NOT is_group)
+    """,
+}
+
+
+def is_enabled():
+    return settings.BOOKING_PARTITIONING and connection.vendor == 'postgresql'
+
+
+def is_partitioned():
+    """Check whether the bookings table is already partitioned."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass',
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def month_start(value):
+    return value.replace(day=1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def get_partitions():
+    """Return {partition name: (lower, upper)} for the attached partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+        """, [TABLE])
+        rows = cursor.fetchall()
+
+    partitions = {}
+    for name, bound in rows:
+        # FOR VALUES FROM ('2026-01-01') TO ('2026-02-01')
+        values = bound.split("'")
+        if len(values) >= 4:
+            partitions[name] = (date.fromisoformat(values[1]), date.fromisoformat(values[3]))
+    return partitions
+
+
+def table_exists(cursor, name):
+    cursor.execute('SELECT to_regclass(%s)', [name])
+    return cursor.fetchone()[0] is not None
+
+
+def insertable_columns(cursor, table):
+    """Return the quoted, comma-separated columns of a table that are not generated."""
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = %s AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """, [table])
+    return ', '.join(f'"{row[0]}"' for row in cursor.fetchall())
+
+
+def add_exclusion_constraints(cursor, name):
+    """Add any missing non-overlap constraints to a partition."""
+    for suffix, definition in EXCLUSION_CONSTRAINTS.items():
+        cursor.execute(
+            'SELECT 1 FROM pg_constraint WHERE conname = %s',
+            [f'{name}_{suffix}'],
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f'ALTER TABLE {name} ADD CONSTRAINT {name}_{suffix} {definition}')
+
+
+def create_default_partition():
+    """Create the DEFAULT partition, for bookings dated outside every monthly partition."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+        add_exclusion_constraints(cursor, DEFAULT_PARTITION)
+
+
+def create_partition(month):
+    """
+    Create the partition for a month, with its own non-overlap constraints.
+    Bookings of the month already in the DEFAULT partition move into it.
+    Must run inside a transaction.
+    """
+    name = partition_name(month)
+    upper = month + relativedelta(months=1)
+    with connection.cursor() as cursor:
+        if not table_exists(cursor, name):
+            moved = f'{name}_moved'
+            has_default = table_exists(cursor, DEFAULT_PARTITION)
+            if has_default:
+                columns = insertable_columns(cursor, TABLE)
+                cursor.execute(f'LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE')
+                cursor.execute(f'CREATE TEMP TABLE {moved} (LIKE {TABLE}) ON COMMIT DROP')
+                cursor.execute(
+                    f'WITH rows AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s '
+                    f'RETURNING {columns}) INSERT INTO {moved} ({columns}) SELECT {columns} FROM rows',
+                    [month, upper],
+                )
+            cursor.execute(
+                f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [month, upper],
+            )
+            if has_default:
+                cursor.execute(f'INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {moved}')
+        add_exclusion_constraints(cursor, name)
+    return name
+
+
+def ensure_partitions(months_ahead):
+    """Create any missing partitions from this month to months_ahead months out."""
+    create_default_partition()
+    this_month = month_start(timezone.now().date())
+    existing = get_partitions()
+    created = []
+    for offset in range(months_ahead + 1):
+        month = this_month + relativedelta(months=offset)
+        if partition_name(month) not in existing:
+            created.append(create_partition(month))
+    return created
+
+
+def detach_partitions(retention_months):
+    """
+    Detach partitions that end before the retention window and the archive
+    cutoff, after moving their bookings to ArchivedBooking. A partition
+    that still has bookings afterwards (active ones, or rows locked by a
+    concurrent archive run) stays attached, so no booking drops out of the
+    booking lists. The detached tables are empty and can be dropped.
+    """
+    cutoff = min(
+        month_start(timezone.now().date()) - relativedelta(months=retention_months),
+        archive.archive_cutoff(),
+    )
+    detached = []
+    for name, (_, upper) in sorted(get_partitions().items()):
+        if upper > cutoff:
+            continue
+        archive.archive_bookings(before=upper)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'SELECT count(*) FROM {name}')
+            remaining = cursor.fetchone()[0]
+            if remaining:
+                logger.warning(f'Not detaching {name}: {remaining} bookings could not be archived')
+                continue
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        detached.append(name)
+    return detached
+
+
+def maintain_partitions():
+    """Create upcoming partitions and detach expired ones. Returns (created, detached)."""
+    if not is_enabled() or not is_partitioned():
+        return [], []
+    with transaction.atomic():
+        created = ensure_partitions(settings.BOOKING_PARTITION_MONTHS_AHEAD)
+    detached = []
+    if settings.BOOKING_PARTITION_RETENTION_MONTHS:
+        detached = detach_partitions(settings.BOOKING_PARTITION_RETENTION_MONTHS)
+    return created, detached
+
+
+def convert_to_partitioned():
+    """
+    Rebuild bookings_booking as a table partitioned by month on date.
+
+    Runs in one transaction and holds an exclusive lock on the table while
+    rows are copied, so schedule it for a maintenance window.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {UNPARTITIONED_TABLE}')
+
+        # Plain indexes and foreign keys are recreated on the partitioned table
+        cursor.execute("""
+            SELECT pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            WHERE i.indrelid = %s::regclass
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+        """, [UNPARTITIONED_TABLE])
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+        """, [UNPARTITIONED_TABLE])
+        foreign_keys = cursor.fetchall()
+        columns = insertable_columns(cursor, UNPARTITIONED_TABLE)
+
+        cursor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {UNPARTITIONED_TABLE} '
+            f'INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE (date)'
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, date)')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+        cursor.execute(f'SELECT min(date), max(date) FROM {UNPARTITIONED_TABLE}')
+        first, last = cursor.fetchone()
+        this_month = month_start(timezone.now().date())
+        month = month_start(first) if first else this_month
+        last_month = max(month_start(last) if last else this_month, this_month)
+        last_month += relativedelta(months=settings.BOOKING_PARTITION_MONTHS_AHEAD)
+        while month <= last_month:
+            create_partition(month)
+            month += relativedelta(months=1)
+        create_default_partition()
+
+        cursor.execute(
+            f'INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {UNPARTITIONED_TABLE}'
+        )
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+            f"coalesce((SELECT max(id) FROM {TABLE}), 0) + 1, false)"
+        )
+        cursor.execute(f'DROP TABLE {UNPARTITIONED_TABLE}')
+
+        for definition in index_definitions:
+            cursor.execute(re.sub(rf' ON (\S+\.)?{UNPARTITIONED_TABLE} ', f' ON {TABLE} ', definition))
@@ -0,0 +1,101 @@
+"""
+Owner search over bookings by customer name, email or phone.
+
+Booking.search_text holds the lowercased customer details, so a search is a
+lookup on one column of one table, with no joins to users:
+
+- PostgreSQL: a trigram GIN index serves substring matches (LIKE) and fuzzy
+  matches (word similarity, so small typos still find the customer).
+- SQLite: an FTS5 table with the trigram tokenizer, synced by triggers.
+  Django rebuilds SQLite tables when a migration alters their columns,
+  which drops the triggers, so restore_fts_triggers re-creates them after
+  every migrate.
+- Anything else: an unindexed substring match.
+
+See migration 0006 for the indexes.
+"""
+from django.db import connection, connections, models
+from django.db.models.expressions import RawSQL
+
+from .models import Booking
+
+# Trigram indexes need at least three characters to narrow anything down
+MIN_QUERY_LENGTH = 3
+
+SEARCH_LIMIT = 20
+
+# As created by migration 0006
+FTS_TRIGGERS = {
+    'bookings_booking_fts_insert': """
+        CREATE TRIGGER bookings_booking_fts_insert AFTER INSERT ON bookings_booking BEGIN
+            INSERT INTO bookings_booking_fts(rowid, search_text) VALUES (new.id, new.search_text);
+        END
+    """,
+    'bookings_booking_fts_delete': """
+        CREATE TRIGGER bookings_booking_fts_delete AFTER DELETE ON bookings_booking BEGIN
+            INSERT INTO bookings_booking_fts(bookings_booking_fts, rowid, search_text)
+                VALUES ('delete', old.id, old.search_text);
+        END
+    """,
+    'bookings_booking_fts_update': """
+        CREATE TRIGGER bookings_booking_fts_update AFTER UPDATE OF search_text ON bookings_booking BEGIN
+            INSERT INTO bookings_booking_fts(bookings_booking_fts, rowid, search_text)
+                VALUES ('delete', old.id, old.search_text);
+            INSERT INTO bookings_booking_fts(rowid, search_text) VALUES (new.id, new.search_text);
+        END
+    """,
+}
+
+
+def normalize_query(query):
+    return ' '.join(query.split()).lower()
+
+
+def matching(bookings, query):
+    """Filter a Booking queryset to rows whose search_text matches query."""
+    table = Booking._meta.db_table
+    if connection.vendor == 'postgresql':
+        # Either a substring or a word similar to the query
+        return bookings.filter(
+            models.Q(search_text__contains=query)
+            | models.Q(RawSQL(f'%s <%% "{table}"."search_text"', (query,), output_field=models.BooleanField()))
+        )
+    if connection.vendor == 'sqlite':
+        phrase = '"{}"'.format(query.replace('"', '""'))
+        return bookings.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s',
+            (phrase,),
+        ))
+    return bookings.filter(search_text__contains=query)
+
+
+def search_bookings(shop, query, limit=SEARCH_LIMIT):
+    """Return up to limit of a shop's bookings matching query, newest first."""
+    query = normalize_query(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    bookings = Booking.objects.filter(shop=shop).select_related('customer', 'staff__user', 'service')
+    return list(matching(bookings, query).order_by('-date', '-start_time', '-pk')[:limit])
+
+
+def restore_fts_triggers(using, **kwargs):
+    """
+    post_migrate handler: on SQLite, re-create any FTS trigger that a table
+    rebuild dropped and rebuild the index, which missed the writes since.
+    """
+    if connections[using].vendor != 'sqlite':
+        return
+    fts_table = f'{Booking._meta.db_table}_fts'
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)',
+            [fts_table, *FTS_TRIGGERS],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in FTS_TRIGGERS if name not in existing]
+        # Before migration 0006 there is nothing to restore
+        if fts_table not in existing or not missing:
+            return
+        for name in missing:
+            cursor.execute(FTS_TRIGGERS[name])
+        cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
@@ -0,0 +1,77 @@
+"""
+Race-free booking creation.
+
+create_booking locks the staff row, re-validates the slot against the
+database and inserts the booking in one transaction, so two requests for
+the same slot cannot both succeed. On PostgreSQL exclusion constraints
+(see migration 0002) also reject overlapping active bookings of a staff
+member at the database level, unless both are group bookings of the same
+service.
+"""
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+
+from apps.staff.models import Staff
+
+from . import availability, holds
+from .models import Booking
+
+
+class SlotUnavailableError(Exception):
+    """Raised when the requested slot is no longer free."""
+
+
+def create_booking(shop, service, staff, date, start_time, check_schedule=True, hold_token=None,
+                   **fields):
+    """
+    Create a booking after re-validating its slot under a row lock on the staff member.
+
+    With check_schedule, the slot must still be offered by the availability
+    engine (working hours, closures, buffers and capacity) and not held by
+    anyone but hold_token, whose hold is released once the booking exists.
+    Without it, as for walk-ins and phone bookings, only overlapping active
+    bookings are rejected. Raises SlotUnavailableError if the slot is taken.
+    """
+    duration = availability.get_service_duration(shop, service, staff)
+    end_time = (datetime.combine(date, start_time) + timedelta(minutes=duration)).time()
+    status = fields.setdefault('status', Booking.Status.CONFIRMED)
+    fields.setdefault('price', service.price)
+    booking = Booking(
+        shop=shop,
+        service=service,
+        staff=staff,
+        date=date,
+        start_time=start_time,
+        end_time=end_time,
+        **fields,
+    )
+
+    try:
+        with transaction.atomic():
+            # Serializes bookings per staff member, not per shop
+            Staff.objects.select_for_update().get(pk=staff.pk)
+
+            if check_schedule:
+                available = (
+                    availability.is_slot_available(shop, service, staff, date, start_time)
+                    and not holds.is_slot_held(shop, service, staff, date, start_time, hold_token)
+                )
+            elif status in availability.ACTIVE_STATUSES:
+                available = not Booking.objects.filter(
+                    staff=staff,
+                    status__in=availability.ACTIVE_STATUSES,
+                ).overlapping(*booking.get_period()).exists()
+            else:
+                available = True
+            if not available:
+                raise SlotUnavailableError('That time is no longer available.')
+
+            booking.save(force_insert=True)
+    except IntegrityError as e:
+        # The PostgreSQL exclusion constraint caught a concurrent insert
+        raise SlotUnavailableError('That time is no longer available.') from e
+
+    if hold_token:
+        holds.release_hold(shop, service, staff, date, start_time, hold_token)
+    return booking
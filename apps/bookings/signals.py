@@ -0,0 +1,91 @@
+"""
+Signal handlers that keep cached availability and denormalized booking
+fields consistent with the database.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.services.models import Service
+from apps.shops.models import BusinessHours, Shop, ShopClosure
+from apps.staff.models import Staff, StaffService, StaffTimeOff, StaffWorkingHours
+
+from . import availability_cache
+from .models import Booking
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_slot(sender, instance, **kwargs):
+    """Remember where a booking was loaded so a move also clears its old day."""
+    # Read __dict__ so deferred fields are not loaded (which would re-enter post_init)
+    instance._loaded_slot = (instance.__dict__.get('staff_id'), instance.__dict__.get('date'))
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_day(sender, instance, **kwargs):
+    slots = {(instance.staff_id, instance.date), getattr(instance, '_loaded_slot', (None, None))}
+    for staff_id, date in slots:
+        if staff_id and date:
+            # After commit, so a concurrent reader cannot cache the pre-commit
+            # state under the new version
+            transaction.on_commit(
+                lambda staff_id=staff_id, date=date: availability_cache.bump_day_version(staff_id, date)
+            )
+    instance._loaded_slot = (instance.staff_id, instance.date)
+
+
+@receiver(post_save, sender=StaffWorkingHours)
+@receiver(post_delete, sender=StaffWorkingHours)
+@receiver(post_save, sender=StaffTimeOff)
+@receiver(post_delete, sender=StaffTimeOff)
+def invalidate_staff_schedule(sender, instance, **kwargs):
+    availability_cache.bump_staff_version(instance.staff_id)
+
+
+@receiver(post_save, sender=StaffService)
+@receiver(post_delete, sender=StaffService)
+def invalidate_staff_services(sender, instance, **kwargs):
+    availability_cache.bump_shop_version(instance.service.shop_id)
+
+
+@receiver(post_save, sender=BusinessHours)
+@receiver(post_delete, sender=BusinessHours)
+@receiver(post_save, sender=ShopClosure)
+@receiver(post_delete, sender=ShopClosure)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+def invalidate_shop_schedule(sender, instance, **kwargs):
+    availability_cache.bump_shop_version(instance.shop_id)
+
+
+@receiver(post_save, sender=Service)
+def flag_group_bookings(sender, instance, **kwargs):
+    """
+    Exempt a service's bookings from the non-overlap constraint once it takes
+    several bookings per slot. Bookings keep the flag if it goes back to one,
+    since existing overlaps are still valid.
+    """
+    if instance.max_bookings_per_slot > 1:
+        Booking.objects.filter(service=instance, is_group=False).update(is_group=True)
+
+
+@receiver(post_save, sender=Shop)
+def invalidate_shop_settings(sender, instance, **kwargs):
+    # Shop.buffer_time pads every booking
+    availability_cache.bump_shop_version(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_customer_search_text(sender, instance, update_fields=None, **kwargs):
+    """Keep Booking.search_text in step with the customer's name, email and phone."""
+    if update_fields is not None and not {'first_name', 'last_name', 'email', 'phone'} & set(update_fields):
+        return
+    bookings = list(instance.bookings.only('pk', 'guest_name', 'guest_email', 'guest_phone', 'customer'))
+    for booking in bookings:
+        booking.customer = instance
+        booking.search_text = booking.get_search_text()
+    Booking.objects.bulk_update(bookings, ['search_text'], batch_size=500)
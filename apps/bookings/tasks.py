@@ -0,0 +1,25 @@
+import logging
+
+from celery import shared_task
+
+from . import archive, partitioning
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def maintain_booking_partitions():
+    """Create upcoming monthly booking partitions and detach expired ones."""
+    created, detached = partitioning.maintain_partitions()
+    if created or detached:
+        logger.info(f'Booking partitions created: {created}, detached: {detached}')
+    return {'created': created, 'detached': detached}
+
+
+@shared_task
+def archive_old_bookings():
+    """Move old terminal bookings to ArchivedBooking."""
+    moved = archive.archive_bookings()
+    if moved:
+        logger.info(f'Archived {moved} bookings')
+    return moved
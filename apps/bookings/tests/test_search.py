@@ -0,0 +1,73 @@
+from datetime import time, timedelta
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.bookings.models import Booking
+from apps.bookings.search import FTS_TRIGGERS, restore_fts_triggers, search_bookings
+from apps.services.models import Service
+from apps.shops.models import Shop
+from apps.staff.models import Staff
+
+
+class SearchBookingsTests(TestCase):
+    """New and edited bookings are found by customer name, email or phone."""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(email='owner@example.com', password='password')
+        cls.shop = Shop.objects.create(
+            owner=owner, name='Shop', slug='shop', email='shop@example.com',
+            phone='1', address='Street 1', city='City', postal_code='1000',
+        )
+        cls.service = Service.objects.create(shop=cls.shop, name='Cut', duration=30, price=Decimal('20'))
+        user = User.objects.create_user(email='staff@example.com', password='password')
+        cls.staff = Staff.objects.create(user=user, shop=cls.shop)
+
+    def create_booking(self, **fields):
+        return Booking.objects.create(
+            shop=self.shop, service=self.service, staff=self.staff,
+            date=timezone.now().date() + timedelta(days=1), start_time=time(10), end_time=time(10, 30),
+            price=self.service.price, **fields,
+        )
+
+    def test_finds_a_new_booking(self):
+        booking = self.create_booking(
+            guest_name='Jane Smith', guest_email='jane@example.com', guest_phone='+1 555-0100',
+        )
+        self.create_booking(guest_name='John Doe')
+        for query in ['smith', 'JANE', 'jane@example', '5550100']:
+            with self.subTest(query=query):
+                self.assertEqual(search_bookings(self.shop, query), [booking])
+
+    def test_finds_an_edited_booking_by_its_new_name(self):
+        booking = self.create_booking(guest_name='Jane Smith')
+        booking.guest_name = 'Jane Jones'
+        booking.save(update_fields=['guest_name'])
+        self.assertEqual(search_bookings(self.shop, 'jones'), [booking])
+        self.assertEqual(search_bookings(self.shop, 'smith'), [])
+
+    def test_status_only_save_keeps_search_text(self):
+        booking = self.create_booking(guest_name='Jane Smith')
+        Booking.objects.filter(pk=booking.pk).update(search_text='stale')
+        booking.status = Booking.Status.CONFIRMED
+        booking.save(update_fields=['status'])
+        booking.refresh_from_db()
+        self.assertEqual(booking.search_text, 'stale')
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS triggers are SQLite only')
+    def test_restores_triggers_dropped_by_a_table_rebuild(self):
+        with connection.cursor() as cursor:
+            for name in FTS_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {name}')
+        booking = self.create_booking(guest_name='Jane Smith')
+        self.assertEqual(search_bookings(self.shop, 'smith'), [])
+
+        restore_fts_triggers(using=connection.alias)
+        self.assertEqual(search_bookings(self.shop, 'smith'), [booking])
+        booking.delete()
+        self.assertEqual(search_bookings(self.shop, 'smith'), [])
@@ -0,0 +1,107 @@
+import threading
+import time as clock
+from datetime import time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.bookings.models import Booking
+from apps.bookings.services import SlotUnavailableError, create_booking
+from apps.services.models import Service
+from apps.shops.models import BusinessHours, Shop
+from apps.staff.models import Staff, StaffService, StaffWorkingHours
+
+
+def create_shop():
+    """Return (shop, service, staff) for a shop open 9:00-17:00 every day."""
+    owner = User.objects.create_user(email='owner@example.com', password='password')
+    shop = Shop.objects.create(
+        owner=owner, name='Shop', slug='shop', email='shop@example.com',
+        phone='1', address='Street 1', city='City', postal_code='1000',
+    )
+    service = Service.objects.create(shop=shop, name='Cut', duration=30, price=Decimal('20'))
+    user = User.objects.create_user(email='staff@example.com', password='password')
+    staff = Staff.objects.create(user=user, shop=shop)
+    StaffService.objects.create(staff=staff, service=service)
+    for day in range(7):
+        BusinessHours.objects.create(shop=shop, day_of_week=day, open_time=time(9), close_time=time(17))
+        StaffWorkingHours.objects.create(staff=staff, day_of_week=day, start_time=time(9), end_time=time(17))
+    return shop, service, staff
+
+
+class CreateBookingTests(TestCase):
+    """create_booking rejects a slot that is taken, whichever check catches it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shop, cls.service, cls.staff = create_shop()
+        cls.date = timezone.now().date() + timedelta(days=1)
+
+    def book(self, **kwargs):
+        return create_booking(
+            self.shop, self.service, self.staff, self.date, time(10),
+            guest_name='Guest', guest_email='guest@example.com', **kwargs,
+        )
+
+    def test_second_booking_of_a_slot_is_rejected(self):
+        self.book()
+        with self.assertRaises(SlotUnavailableError):
+            self.book()
+        with self.assertRaises(SlotUnavailableError):
+            self.book(check_schedule=False)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_constraint_violation_becomes_slot_unavailable(self):
+        # As raised by the exclusion constraint when a concurrent insert wins
+        with mock.patch.object(Booking, 'save', side_effect=IntegrityError('no_double_booking')):
+            with self.assertRaises(SlotUnavailableError) as context:
+                self.book()
+        self.assertIsInstance(context.exception.__cause__, IntegrityError)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_group_service_bookings_share_a_slot(self):
+        self.service.max_bookings_per_slot = 2
+        self.service.save()
+        first = self.book()
+        second = self.book()
+        self.assertTrue(first.is_group and second.is_group)
+        with self.assertRaises(SlotUnavailableError):
+            self.book()
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class CreateBookingRaceTests(TransactionTestCase):
+    """A request waiting on the staff row lock sees the booking that held it."""
+
+    def test_waiting_request_revalidates_after_the_lock(self):
+        shop, service, staff = create_shop()
+        date = timezone.now().date() + timedelta(days=1)
+        errors = []
+
+        def book():
+            try:
+                create_booking(shop, service, staff, date, time(10), guest_name='Second')
+            except SlotUnavailableError as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            Staff.objects.select_for_update().get(pk=staff.pk)
+            thread = threading.Thread(target=book)
+            thread.start()
+            # Let the second request block on the lock before this one books
+            clock.sleep(0.5)
+            self.assertTrue(thread.is_alive())
+            Booking.objects.create(
+                shop=shop, service=service, staff=staff, date=date,
+                start_time=time(10), end_time=time(10, 30), price=service.price, guest_name='First',
+            )
+        thread.join()
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(list(Booking.objects.values_list('guest_name', flat=True)), ['First'])
@@ -14,6 +14,10 @@ urlpatterns = [
 
     # Shop owner management
     path('<slug:slug>/manage/', views.booking_list_view, name='manage_list'),
+    path('<slug:slug>/manage/more/', views.booking_list_more_view, name='manage_list_more'),
+    path('<slug:slug>/manage/calendar/', views.booking_calendar_view, name='manage_calendar'),
+    path('<slug:slug>/manage/export/', views.booking_export_view, name='manage_export'),
+    path('<slug:slug>/manage/search/', views.booking_search_view, name='manage_search'),
     path('<slug:slug>/manage/create/', views.booking_create_view, name='manage_create'),
     path('<slug:slug>/manage/<int:pk>/', views.booking_detail_view, name='manage_detail'),
     path('<slug:slug>/manage/<int:pk>/status/', views.booking_status_view, name='manage_status'),
@@ -21,8 +25,14 @@ urlpatterns = [
 
     # Customer's own bookings
     path('my-bookings/', views.my_bookings_view, name='my_bookings'),
+    path('my-bookings/more/', views.my_bookings_more_view, name='my_bookings_more'),
     path('my-bookings/<int:pk>/cancel/', views.my_booking_cancel_view, name='my_booking_cancel'),
+    path('my-bookings/feed/reset/', views.my_feed_reset_view, name='my_feed_reset'),
+
+    # Calendar subscription feeds (signed, no login)
+    path('feeds/<str:token>/calendar.ics', views.calendar_feed_view, name='calendar_feed'),
 
     # API / HTMX endpoints
     path('<slug:slug>/api/slots/', views.slots_api_view, name='api_slots'),
+    path('<slug:slug>/api/next-available/', views.next_available_api_view, name='api_next_available'),
 ]
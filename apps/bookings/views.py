@@ -1,10 +1,15 @@
 from datetime import datetime, timedelta
 
 from django.contrib import messages
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.http import Http404, JsonResponse
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag, urlencode
 from django.views.decorators.http import require_POST
 from django_ratelimit.decorators import ratelimit
 
@@ -12,13 +17,22 @@ from apps.services.models import Service
 from apps.shops.models import Shop
 from apps.staff.models import Staff
 
+from . import archive, calendar_layout, export, feeds, holds, pagination, search
+from .availability import (
+    ACTIVE_STATUSES,
+    find_available_staff,
+    find_next_available,
+    get_available_slots_range,
+    get_service_duration,
+)
 from .forms import (
     BookingCancelForm,
     BookingForm,
     ManualBookingForm,
     get_available_slots,
 )
-from .models import Booking
+from .models import ArchivedBooking, Booking
+from .services import SlotUnavailableError, create_booking
 
 
 # ============================================
@@ -76,12 +90,20 @@ def booking_datetime_view(request, slug, service_pk):
     else:
         selected_date = timezone.now().date()
 
-    # Get available slots
-    slots = get_available_slots(shop, service, staff, selected_date)
-
-    # Generate dates for the next 14 days
+    # Compute the next 14 days in one pass so full days can be greyed out,
+    # hiding slots other customers are holding
     today = timezone.now().date()
-    dates = [(today + timedelta(days=i)) for i in range(14)]
+    hold_token = holds.get_token(request)
+    days = get_available_slots_range(
+        shop, service, staff, today, today + timedelta(days=13), hold_token=hold_token
+    )
+
+    # Reuse the strip results unless the selected date falls outside it
+    slots_by_date = {day.date: day.slots for day in days}
+    if selected_date in slots_by_date:
+        slots = slots_by_date[selected_date]
+    else:
+        slots = get_available_slots(shop, service, staff, selected_date, hold_token=hold_token)
 
     return render(request, 'bookings/datetime.html', {
         'shop': shop,
@@ -89,10 +111,11 @@ def booking_datetime_view(request, slug, service_pk):
         'staff': staff,
         'selected_date': selected_date,
         'slots': slots,
-        'dates': dates,
+        'days': days,
     })
 
 
+@ratelimit(key='ip', rate='10/m', method='GET', block=True)
 def booking_confirm_view(request, slug, service_pk):
     """Confirm booking details and submit."""
     shop = get_object_or_404(Shop, slug=slug, is_active=True)
@@ -117,42 +140,44 @@ def booking_confirm_view(request, slug, service_pk):
         messages.error(request, 'Invalid date or time.')
         return redirect('bookings:datetime', slug=slug, service_pk=service_pk)
 
-    # Calculate end time
+    # Calculate end time, using the staff member's custom duration if any
     start_dt = datetime.combine(booking_date, booking_time)
-    end_dt = start_dt + timedelta(minutes=service.duration)
+    duration = get_service_duration(shop, service, staff) if staff else service.duration
+    end_dt = start_dt + timedelta(minutes=duration)
+
+    hold_token = holds.get_token(request)
 
     if request.method == 'POST':
         # Process the booking
         user = request.user if request.user.is_authenticated else None
 
-        # If no staff selected, assign first available
+        # If no staff selected, assign the staff member who covers this slot
         if not staff:
-            available_staff = Staff.objects.filter(
-                shop=shop,
-                is_active=True,
-                accepts_bookings=True,
-                services=service,
-            ).first()
-            if not available_staff:
-                messages.error(request, 'No staff available for this service.')
-                return redirect('bookings:start', slug=slug)
-            staff = available_staff
-
-        booking = Booking.objects.create(
-            shop=shop,
-            customer=user,
-            staff=staff,
-            service=service,
-            date=booking_date,
-            start_time=booking_time,
-            end_time=end_dt.time(),
-            status=Booking.Status.CONFIRMED,
-            guest_name=request.POST.get('guest_name', ''),
-            guest_email=request.POST.get('guest_email', ''),
-            guest_phone=request.POST.get('guest_phone', ''),
-            notes=request.POST.get('notes', ''),
-            price=service.price,
-        )
+            staff = find_available_staff(shop, service, booking_date, booking_time, hold_token)
+
+        # Re-validated under a lock, since the slot may have been taken meanwhile
+        booking = None
+        if staff:
+            try:
+                booking = create_booking(
+                    shop,
+                    service,
+                    staff,
+                    booking_date,
+                    booking_time,
+                    hold_token=hold_token,
+                    customer=user,
+                    status=Booking.Status.CONFIRMED,
+                    guest_name=request.POST.get('guest_name', ''),
+                    guest_email=request.POST.get('guest_email', ''),
+                    guest_phone=request.POST.get('guest_phone', ''),
+                    notes=request.POST.get('notes', ''),
+                )
+            except SlotUnavailableError:
+                pass
+        if booking is None:
+            messages.error(request, 'That time is no longer available. Please choose another.')
+            return redirect('bookings:datetime', slug=slug, service_pk=service_pk)
 
         # Store booking ID in session to allow access to success page
         request.session['recent_booking_id'] = booking.pk
@@ -160,6 +185,12 @@ def booking_confirm_view(request, slug, service_pk):
         messages.success(request, 'Your booking has been confirmed!')
         return redirect('bookings:success', slug=slug, pk=booking.pk)
 
+    # Hold the slot while the customer fills in the form
+    holder = staff or find_available_staff(shop, service, booking_date, booking_time, hold_token)
+    if not holder or not holds.place_hold(shop, service, holder, booking_date, booking_time, hold_token):
+        messages.error(request, 'That time is no longer available. Please choose another.')
+        return redirect('bookings:datetime', slug=slug, service_pk=service_pk)
+
     return render(request, 'bookings/confirm.html', {
         'shop': shop,
         'service': service,
@@ -208,52 +239,159 @@ def booking_success_view(request, slug, pk):
 def get_shop_for_owner(request, slug):
     """Get shop and verify ownership."""
     shop = get_object_or_404(Shop, slug=slug)
-    if shop.owner != request.user:
+    if shop.owner_id != request.user.pk:
         raise Http404("Shop not found")
     return shop
 
 
-@login_required
-def booking_list_view(request, slug):
-    """List all bookings for a shop (owner view)."""
-    shop = get_shop_for_owner(request, slug)
+def get_booking_list_filters(request):
+    """Return the owner booking list filters as (lookups, filter date)."""
+    filters = {}
+    filter_date = None
+    if request.GET.get('status'):
+        filters['status'] = request.GET['status']
+    if request.GET.get('date'):
+        try:
+            filter_date = datetime.strptime(request.GET['date'], '%Y-%m-%d').date()
+            filters['date'] = filter_date
+        except ValueError:
+            pass
+    if request.GET.get('staff'):
+        filters['staff_id'] = request.GET['staff']
+    return filters, filter_date
 
-    # Filter options
-    status_filter = request.GET.get('status', '')
-    date_filter = request.GET.get('date', '')
-    staff_filter = request.GET.get('staff', '')
 
-    bookings = Booking.objects.filter(shop=shop).select_related(
+def get_booking_list_page(request, shop, section, cursor=None):
+    """Return (page, load more URL) for the upcoming or past owner booking list."""
+    filters, filter_date = get_booking_list_filters(request)
+    bookings = Booking.objects.filter(shop=shop, **filters).select_related(
         'customer', 'staff__user', 'service'
     )
 
-    if status_filter:
-        bookings = bookings.filter(status=status_filter)
-    if date_filter:
-        try:
-            filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            bookings = bookings.filter(date=filter_date)
-        except ValueError:
-            pass
-    if staff_filter:
-        bookings = bookings.filter(staff_id=staff_filter)
-
-    # Default: show upcoming first
     today = timezone.now().date()
-    upcoming = bookings.filter(date__gte=today).order_by('date', 'start_time')
-    past = bookings.filter(date__lt=today).order_by('-date', '-start_time')
+    if section == 'upcoming':
+        page = pagination.paginate(bookings.filter(date__gte=today), cursor)
+    else:
+        # Old dates may have been moved to the archive
+        archived = None
+        if filter_date is None or archive.includes_archive(filter_date):
+            archived = ArchivedBooking.objects.filter(shop=shop, **filters).select_related(
+                'customer', 'staff__user', 'service'
+            )
+        page = pagination.paginate(
+            bookings.filter(date__lt=today),
+            cursor,
+            descending=True,
+            archived=archived,
+            archived_before=archive.archive_cutoff(),
+        )
+
+    more_url = None
+    if page.next_cursor:
+        query = request.GET.copy()
+        query['list'] = section
+        query['cursor'] = page.next_cursor
+        more_url = f"{reverse('bookings:manage_list_more', args=[shop.slug])}?{query.urlencode()}"
+    return page, more_url
+
+
+@login_required
+def booking_list_view(request, slug):
+    """List all bookings for a shop (owner view)."""
+    shop = get_shop_for_owner(request, slug)
+
+    upcoming, upcoming_more_url = get_booking_list_page(request, shop, 'upcoming')
+    past, past_more_url = get_booking_list_page(request, shop, 'past')
 
     staff_members = Staff.objects.filter(shop=shop, is_active=True)
 
     return render(request, 'bookings/manage/list.html', {
         'shop': shop,
-        'upcoming_bookings': upcoming,
-        'past_bookings': past,
+        'upcoming_bookings': upcoming.items,
+        'upcoming_more_url': upcoming_more_url,
+        'past_bookings': past.items,
+        'past_more_url': past_more_url,
         'staff_members': staff_members,
         'status_choices': Booking.Status.choices,
-        'status_filter': status_filter,
-        'date_filter': date_filter,
-        'staff_filter': staff_filter,
+        'status_filter': request.GET.get('status', ''),
+        'date_filter': request.GET.get('date', ''),
+        'staff_filter': request.GET.get('staff', ''),
+    })
+
+
+@login_required
+def booking_list_more_view(request, slug):
+    """Next page of the upcoming or past owner booking list (used with HTMX)."""
+    shop = get_shop_for_owner(request, slug)
+    section = 'past' if request.GET.get('list') == 'past' else 'upcoming'
+    page, more_url = get_booking_list_page(request, shop, section, request.GET.get('cursor'))
+
+    return render(request, 'bookings/partials/manage_booking_rows.html', {
+        'shop': shop,
+        'bookings': page.items,
+        'more_url': more_url,
+        'past': section == 'past',
+    })
+
+
+@login_required
+def booking_calendar_view(request, slug):
+    """Staff-column day or week calendar of a shop's bookings (owner view)."""
+    shop = get_shop_for_owner(request, slug)
+
+    view = request.GET.get('view')
+    if view not in calendar_layout.CALENDAR_VIEWS:
+        view = 'week'
+    today = timezone.localdate()
+    try:
+        selected_date = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        selected_date = today
+
+    calendar = calendar_layout.build_calendar(shop, view, selected_date)
+    step = timedelta(days=calendar_layout.CALENDAR_VIEWS[view])
+    context = {
+        'shop': shop,
+        'calendar': calendar,
+        'calendar_views': calendar_layout.CALENDAR_VIEWS,
+        'previous_date': calendar.start - step,
+        'next_date': calendar.start + step,
+        'today': today,
+    }
+
+    # HTMX navigation swaps only the calendar
+    if request.headers.get('HX-Request'):
+        return render(request, 'bookings/partials/manage_calendar.html', context)
+    return render(request, 'bookings/manage/calendar.html', context)
+
+
+@login_required
+def booking_export_view(request, slug):
+    """Stream the shop's bookings as CSV, with the booking list filters."""
+    shop = get_shop_for_owner(request, slug)
+    filters, filter_date = get_booking_list_filters(request)
+    include_archive = filter_date is None or archive.includes_archive(filter_date)
+
+    response = StreamingHttpResponse(
+        export.export_bookings(shop, filters, include_archive),
+        content_type='text/csv; charset=utf-8',
+    )
+    filename = f'{shop.slug}-bookings-{timezone.now().date().isoformat()}.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+def booking_search_view(request, slug):
+    """Search a shop's bookings by customer name, email or phone (used with HTMX)."""
+    shop = get_shop_for_owner(request, slug)
+    query = request.GET.get('q', '')
+
+    return render(request, 'bookings/partials/manage_booking_search.html', {
+        'shop': shop,
+        'query': query,
+        'bookings': search.search_bookings(shop, query),
+        'min_length': search.MIN_QUERY_LENGTH,
     })
 
 
@@ -261,7 +399,9 @@ def booking_list_view(request, slug):
 def booking_detail_view(request, slug, pk):
     """View booking details (owner view)."""
     shop = get_shop_for_owner(request, slug)
-    booking = get_object_or_404(Booking, pk=pk, shop=shop)
+    booking = Booking.objects.filter(pk=pk, shop=shop).first()
+    if booking is None:
+        booking = get_object_or_404(ArchivedBooking, pk=pk, shop=shop)
 
     return render(request, 'bookings/manage/detail.html', {
         'shop': shop,
@@ -277,9 +417,13 @@ def booking_create_view(request, slug):
     if request.method == 'POST':
         form = ManualBookingForm(shop, request.POST)
         if form.is_valid():
-            booking = form.save()
-            messages.success(request, 'Booking created successfully!')
-            return redirect('bookings:manage_list', slug=shop.slug)
+            try:
+                form.save()
+            except SlotUnavailableError:
+                form.add_error('start_time', 'This staff member already has a booking at that time.')
+            else:
+                messages.success(request, 'Booking created successfully!')
+                return redirect('bookings:manage_list', slug=shop.slug)
     else:
         form = ManualBookingForm(shop)
 
@@ -336,20 +480,69 @@ def booking_cancel_view(request, slug, pk):
 # Customer Booking Management Views
 # ============================================
 
+def get_my_bookings_page(request, section, cursor=None):
+    """Return (page, load more URL) for the customer's upcoming or past bookings."""
+    # Upcoming and past are exact complements, so every booking is listed once
+    upcoming = Q(date__gte=timezone.now().date(), status__in=ACTIVE_STATUSES)
+    bookings = Booking.objects.filter(customer=request.user).select_related(
+        'shop', 'staff__user', 'service'
+    )
+
+    if section == 'upcoming':
+        page = pagination.paginate(bookings.filter(upcoming), cursor)
+    else:
+        archived = ArchivedBooking.objects.filter(customer=request.user).select_related(
+            'shop', 'staff__user', 'service'
+        )
+        page = pagination.paginate(
+            bookings.exclude(upcoming),
+            cursor,
+            descending=True,
+            archived=archived,
+            archived_before=archive.archive_cutoff(),
+        )
+
+    more_url = None
+    if page.next_cursor:
+        query = urlencode({'list': section, 'cursor': page.next_cursor})
+        more_url = f"{reverse('bookings:my_bookings_more')}?{query}"
+    return page, more_url
+
+
 @login_required
 def my_bookings_view(request):
     """View customer's own bookings."""
-    bookings = Booking.objects.filter(
-        customer=request.user
-    ).select_related('shop', 'staff__user', 'service').order_by('-date', '-start_time')
-
-    today = timezone.now().date()
-    upcoming = [b for b in bookings if b.date >= today and b.status in ['pending', 'confirmed']]
-    past = [b for b in bookings if b.date < today or b.status in ['completed', 'cancelled', 'no_show']]
+    upcoming, upcoming_more_url = get_my_bookings_page(request, 'upcoming')
+    past, past_more_url = get_my_bookings_page(request, 'past')
 
     return render(request, 'bookings/my_bookings.html', {
-        'upcoming_bookings': upcoming,
-        'past_bookings': past,
+        'upcoming_bookings': upcoming.items,
+        'upcoming_more_url': upcoming_more_url,
+        'past_bookings': past.items,
+        'past_more_url': past_more_url,
+        'feed_url': feeds.feed_url(request, 'customer', request.user),
+    })
+
+
+@login_required
+@require_POST
+def my_feed_reset_view(request):
+    """Replace the customer's calendar feed URL, revoking the old one."""
+    feeds.reset_feed_key(request.user)
+    messages.success(request, 'Your calendar link has been reset. Subscribe again with the new link.')
+    return redirect('bookings:my_bookings')
+
+
+@login_required
+def my_bookings_more_view(request):
+    """Next page of the customer's upcoming or past bookings (used with HTMX)."""
+    section = 'past' if request.GET.get('list') == 'past' else 'upcoming'
+    page, more_url = get_my_bookings_page(request, section, request.GET.get('cursor'))
+
+    return render(request, 'bookings/partials/my_booking_rows.html', {
+        'bookings': page.items,
+        'more_url': more_url,
+        'past': section == 'past',
     })
 
 
@@ -401,11 +594,85 @@ def slots_api_view(request, slug):
         except Staff.DoesNotExist:
             pass
 
-    slots = get_available_slots(shop, service, staff, selected_date)
+    slots = get_available_slots(shop, service, staff, selected_date, hold_token=holds.get_token(request))
 
     return render(request, 'bookings/partials/slots.html', {
+        'shop': shop,
         'slots': slots,
         'service': service,
         'staff': staff,
         'selected_date': selected_date,
     })
+
+
+@ratelimit(key='ip', rate='30/m', block=True)
+def next_available_api_view(request, slug):
+    """API endpoint for the first free slot on or after a date (used with HTMX)."""
+    shop = get_object_or_404(Shop, slug=slug, is_active=True)
+
+    service_pk = request.GET.get('service')
+    staff_pk = request.GET.get('staff')
+    date_str = request.GET.get('date')
+
+    try:
+        service = Service.objects.get(pk=service_pk, shop=shop, is_active=True)
+    except (Service.DoesNotExist, ValueError):
+        return render(request, 'bookings/partials/next_available.html', {'next_slot': None})
+
+    staff = None
+    if staff_pk:
+        try:
+            staff = Staff.objects.get(pk=staff_pk, shop=shop)
+        except (Staff.DoesNotExist, ValueError):
+            pass
+
+    after = None
+    if date_str:
+        try:
+            after = timezone.make_aware(datetime.strptime(date_str, '%Y-%m-%d'))
+        except ValueError:
+            pass
+
+    return render(request, 'bookings/partials/next_available.html', {
+        'shop': shop,
+        'service': service,
+        'staff': staff,
+        'next_slot': find_next_available(
+            shop, service, staff, after=after, hold_token=holds.get_token(request)
+        ),
+    })
+
+
+# ============================================
+# Calendar Feeds
+# ============================================
+
+def calendar_feed_view(request, token):
+    """iCalendar subscription feed of a staff member's or customer's bookings."""
+    token_data = feeds.read_token(token)
+    if token_data is None:
+        raise Http404('Feed not found')
+    kind, pk, key = token_data
+    if kind == 'staff':
+        owner = get_object_or_404(Staff.objects.select_related('user', 'shop'), pk=pk)
+        name = f'{owner.display_name} - {owner.shop.name}'
+        name_changed_at = [owner.user.updated_at, owner.shop.updated_at]
+    else:
+        owner = get_object_or_404(get_user_model(), pk=pk)
+        name = f'{owner.get_full_name()} - AppointHub'
+        name_changed_at = [owner.updated_at]
+    # A reset key revokes every URL signed with the old one
+    if key != owner.feed_key:
+        raise Http404('Feed not found')
+
+    # Unchanged feeds are answered from one aggregate query
+    etag = feeds.feed_etag(kind, pk, name_changed_at)
+    response = get_conditional_response(request, etag=quote_etag(etag))
+    if response is None:
+        response = HttpResponse(
+            feeds.get_feed(kind, pk, name, etag),
+            content_type='text/calendar; charset=utf-8',
+        )
+        response['ETag'] = quote_etag(etag)
+    patch_cache_control(response, private=True, max_age=300)
+    return response
@@ -1,3 +1,43 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DailyServiceStats, DailyShopStats, DailyStaffStats, ShopCustomerStats
+
+
+@admin.register(DailyShopStats)
+class DailyShopStatsAdmin(admin.ModelAdmin):
+    list_display = [
+        'shop', 'date', 'pending', 'confirmed', 'completed',
+        'cancelled', 'no_show', 'revenue', 'new_customers'
+    ]
+    list_filter = ['shop']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(DailyServiceStats)
+class DailyServiceStatsAdmin(admin.ModelAdmin):
+    list_display = ['service', 'shop', 'date', 'bookings']
+    list_filter = ['shop']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+
+
+@admin.register(DailyStaffStats)
+class DailyStaffStatsAdmin(admin.ModelAdmin):
+    list_display = ['staff', 'shop', 'date', 'bookings', 'minutes']
+    list_filter = ['shop']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+
+
+@admin.register(ShopCustomerStats)
+class ShopCustomerStatsAdmin(admin.ModelAdmin):
+    list_display = [
+        'name', 'email', 'shop', 'total_bookings', 'completed_bookings',
+        'total_spent', 'first_visit', 'last_visit'
+    ]
+    list_filter = ['shop']
+    search_fields = ['name', 'email', 'phone']
+    ordering = ['-total_spent']
+    raw_id_fields = ['customer']
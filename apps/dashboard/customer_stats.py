@@ -0,0 +1,214 @@
+"""
+Lifetime customer totals behind the customers page.
+
+ShopCustomerStats holds one row per customer of a shop, so the page sorts
+and filters indexed columns instead of grouping every booking by customer.
+apply_customer_change() keeps the rows live from the same booking saves and
+deletes as the daily rollups (see signals.py): counts and spend change by F()
+increments, and first and last visits only go back to the bookings when a
+booking stops counting towards them. rebuild() re-derives whole shops from
+live and archived bookings.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, Lower
+
+from apps.bookings.models import ArchivedBooking, Booking
+
+from .models import ShopCustomerStats
+from .rollups import customer_key, customers_lookup
+
+TOTAL_FIELDS = ['total_bookings', 'completed_bookings', 'cancelled_bookings', 'total_spent']
+
+
+def customer_share(state):
+    """
+    Return ((shop_id, key), {field: delta}, first visit, last visit) of a
+    booking state's share of its customer's totals, or None.
+    """
+    if state is None:
+        return None
+    shop_id, date, status, price = state[:4]
+    key = customer_key(state[8], state[9])
+    if key is None:
+        return None
+    if status == Booking.Status.CANCELLED:
+        return (shop_id, key), {'cancelled_bookings': 1}, None, None
+    if status == Booking.Status.COMPLETED:
+        return (shop_id, key), {'total_bookings': 1, 'completed_bookings': 1, 'total_spent': Decimal(price)}, date, date
+    return (shop_id, key), {'total_bookings': 1}, date, None
+
+
+def customer_details(booking):
+    """Name, email and phone of a booking's customer."""
+    if booking.customer_id:
+        user = booking.customer
+        return {
+            'customer': user,
+            'name': user.get_full_name() or user.email,
+            'email': user.email,
+            'phone': user.phone,
+        }
+    return {
+        'name': booking.guest_name or booking.guest_email,
+        'email': booking.guest_email.strip().lower(),
+        'phone': booking.guest_phone,
+    }
+
+
+def visit_dates(shop_id, key):
+    """Re-read a customer's first and last visit from the bookings."""
+    first, last = [], []
+    for model in (Booking, ArchivedBooking):
+        dates = model.objects.filter(shop_id=shop_id, **customers_lookup(key)).order_by().aggregate(
+            first=Min('date', filter=~Q(status=Booking.Status.CANCELLED)),
+            last=Max('date', filter=Q(status=Booking.Status.COMPLETED)),
+        )
+        first.append(dates['first'])
+        last.append(dates['last'])
+    return (
+        min(filter(None, first), default=None),
+        max(filter(None, last), default=None),
+    )
+
+
+def apply_customer_change(old, new, booking):
+    """
+    Update the customer totals for a booking going from state old to state
+    new (None for a booking that did not exist, or was deleted). Run it
+    after the booking is saved or deleted, in the same transaction.
+    """
+    if old == new:
+        return
+    changes = defaultdict(lambda: {'deltas': {}, 'first': None, 'last': None})
+    for share, sign in ((customer_share(old), -1), (customer_share(new), 1)):
+        if share is None:
+            continue
+        shop_key, deltas, first, last = share
+        change = changes[shop_key]
+        for field, delta in deltas.items():
+            change['deltas'][field] = change['deltas'].get(field, 0) + sign * delta
+        if sign < 0:
+            change['old_dates'] = (first, last)
+        else:
+            change['first'], change['last'] = first, last
+
+    for (shop_id, key), change in changes.items():
+        deltas = {field: delta for field, delta in change['deltas'].items() if delta}
+        updates = {field: F(field) + delta for field, delta in deltas.items()}
+        first, last = change['first'], change['last']
+        old_first, old_last = change.get('old_dates', (None, None))
+        if (old_first and old_first != first) or (old_last and old_last != last):
+            # The booking may have been the first or last visit
+            updates['first_visit'], updates['last_visit'] = visit_dates(shop_id, key)
+        else:
+            if first and first != old_first:
+                updates['first_visit'] = Least(Coalesce(F('first_visit'), Value(first)), Value(first))
+            if last and last != old_last:
+                updates['last_visit'] = Greatest(Coalesce(F('last_visit'), Value(last)), Value(last))
+        if not updates or ShopCustomerStats.objects.filter(shop_id=shop_id, key=key).update(**updates):
+            continue
+        # A deleted booking's row is only missing if its shop was deleted too
+        if new is not None:
+            create_row(shop_id, key, booking, deltas, updates)
+
+
+def create_row(shop_id, key, booking, deltas, updates):
+    """Create a customer's row, or update it if a concurrent save created it first."""
+    first, last = visit_dates(shop_id, key)
+    try:
+        with transaction.atomic():
+            ShopCustomerStats.objects.create(
+                shop_id=shop_id,
+                key=key,
+                first_visit=first,
+                last_visit=last,
+                **{field: max(delta, 0) for field, delta in deltas.items()},
+                **customer_details(booking),
+            )
+    except IntegrityError:
+        ShopCustomerStats.objects.filter(shop_id=shop_id, key=key).update(**updates)
+
+
+def refresh_customer_details(user):
+    """Copy an account's name, email and phone to its customer rows."""
+    ShopCustomerStats.objects.filter(customer=user).update(
+        name=user.get_full_name() or user.email,
+        email=user.email,
+        phone=user.phone,
+    )
+
+
+def derive(shop_ids=None):
+    """Compute {(shop_id, key): values} of every customer from live and archived bookings."""
+    totals = {}
+    aggregates = {
+        'total_bookings': Count('pk', filter=~Q(status=Booking.Status.CANCELLED)),
+        'completed_bookings': Count('pk', filter=Q(status=Booking.Status.COMPLETED)),
+        'cancelled_bookings': Count('pk', filter=Q(status=Booking.Status.CANCELLED)),
+        'total_spent': Coalesce(Sum('price', filter=Q(status=Booking.Status.COMPLETED)), Decimal('0')),
+        'first_visit': Min('date', filter=~Q(status=Booking.Status.CANCELLED)),
+        'last_visit': Max('date', filter=Q(status=Booking.Status.COMPLETED)),
+    }
+    for model in (Booking, ArchivedBooking):
+        bookings = model.objects.order_by()
+        if shop_ids is not None:
+            bookings = bookings.filter(shop_id__in=shop_ids)
+        registered = (
+            bookings.filter(customer__isnull=False)
+            .values('shop_id', 'customer_id')
+            .annotate(**aggregates)
+        )
+        guests = (
+            bookings.filter(customer__isnull=True).exclude(guest_email='')
+            .values('shop_id', guest=Lower('guest_email'))
+            .annotate(guest_name=Max('guest_name'), guest_phone=Max('guest_phone'), **aggregates)
+        )
+        for row in registered:
+            merge(totals, (row['shop_id'], customer_key(row['customer_id'], None)), row)
+        for row in guests:
+            merge(totals, (row['shop_id'], customer_key(None, row['guest'])), row)
+    return totals
+
+
+def merge(totals, shop_key, row):
+    values = totals.get(shop_key)
+    if values is None:
+        totals[shop_key] = row
+        return
+    for field in TOTAL_FIELDS:
+        values[field] += row[field]
+    values['first_visit'] = min(filter(None, [values['first_visit'], row['first_visit']]), default=None)
+    values['last_visit'] = max(filter(None, [values['last_visit'], row['last_visit']]), default=None)
+
+
+def rebuild(shop_ids=None):
+    """Re-derive the customer rows of shops (default all), replacing existing rows. Returns the row count."""
+    User = get_user_model()
+    with transaction.atomic():
+        totals = derive(shop_ids)
+        users = User.objects.in_bulk({values['customer_id'] for values in totals.values() if 'customer_id' in values})
+        rows = []
+        for (shop_id, key), values in totals.items():
+            if 'customer_id' in values:
+                user = users[values['customer_id']]
+                details = {'customer': user, 'name': user.get_full_name() or user.email,
+                           'email': user.email, 'phone': user.phone}
+            else:
+                details = {'name': values['guest_name'] or values['guest'], 'email': values['guest'],
+                           'phone': values['guest_phone']}
+            rows.append(ShopCustomerStats(
+                shop_id=shop_id, key=key,
+                first_visit=values['first_visit'], last_visit=values['last_visit'],
+                **{field: values[field] for field in TOTAL_FIELDS}, **details,
+            ))
+        stored = ShopCustomerStats.objects.all()
+        if shop_ids is not None:
+            stored = stored.filter(shop_id__in=shop_ids)
+        stored.delete()
+        ShopCustomerStats.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,73 @@
+"""
+Per-shop cache of dashboard fragments (stat cards, charts, today's list).
+
+As in apps/bookings/availability_cache.py, entries are never deleted.
+Their keys embed a shop version stamp that writes bump (see signals.py):
+
+- data version: any booking, service or staff write of the shop
+- history version: booking writes dated before the current month, and
+  service or staff writes
+
+Fragments of past months embed only the history version, so they stay
+cached for weeks while today's bookings come and go. Fragments involving
+the current month or today embed the data version and expire quickly.
+"""
+import time
+
+from django.core.cache import cache
+
+# Fragments of the current month and of today (seconds)
+LIVE_CACHE_TIMEOUT = 60 * 5
+TODAY_CACHE_TIMEOUT = 60
+
+# Fragments of past months
+HISTORY_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+# Version stamps outlive the entries that embed them
+VERSION_TIMEOUT = HISTORY_CACHE_TIMEOUT * 2
+
+
+def data_version_key(shop_id):
+    return f'dashboard:version:data:{shop_id}'
+
+
+def history_version_key(shop_id):
+    return f'dashboard:version:history:{shop_id}'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Time-based so an evicted version never restarts at a previously used value
+        cache.add(key, time.time_ns(), VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), VERSION_TIMEOUT)
+
+
+def bump_shop(shop_id, history=False):
+    """Invalidate a shop's live fragments, and with history its past months too."""
+    bump_version(data_version_key(shop_id))
+    if history:
+        bump_version(history_version_key(shop_id))
+
+
+def get_fragment(shop_id, name, build, history=False, timeout=LIVE_CACHE_TIMEOUT):
+    """
+    Return a cached fragment of a shop's dashboard, calling build() to
+    compute it on a miss. name must identify everything the fragment
+    depends on besides the shop's data (e.g. the month).
+    """
+    version_key = history_version_key(shop_id) if history else data_version_key(shop_id)
+    key = f'dashboard:fragment:{shop_id}:{name}:{get_version(version_key)}'
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
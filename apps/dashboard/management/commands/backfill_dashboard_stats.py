@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard import customer_stats, rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the daily dashboard rollups and lifetime customer stats from live '
+        'and archived bookings. --from and --to only limit the daily rollups.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shop', type=int, action='append', help='Only this shop id (repeatable).')
+        parser.add_argument('--from', dest='start', type=date.fromisoformat, help='First day (YYYY-MM-DD).')
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, help='Last day (YYYY-MM-DD).')
+
+    def handle(self, *args, **options):
+        shop_ids = options['shop']
+        first, last = rollups.booking_date_range(shop_ids)
+        start = options['start'] or first
+        end = options['end'] or last
+        if start is None or end is None:
+            self.stdout.write('No bookings to roll up.')
+            return
+        if start > end:
+            raise CommandError('--from must not be after --to.')
+        written = rollups.rebuild(start, end, shop_ids=shop_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {written} shop-days from {start} to {end}.'))
+        customers = customer_stats.rebuild(shop_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats of {customers} customers.'))
@@ -0,0 +1,129 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("services", "0001_initial"),
+        ("shops", "0002_shop_schedule_version"),
+        ("staff", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyServiceStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("bookings", models.IntegerField(default=0)),
+                (
+                    "service",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="services.service",
+                    ),
+                ),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_service_stats",
+                        to="shops.shop",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Daily service stats",
+                "unique_together": {("shop", "date", "service")},
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyShopStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("pending", models.IntegerField(default=0)),
+                ("confirmed", models.IntegerField(default=0)),
+                ("completed", models.IntegerField(default=0)),
+                ("cancelled", models.IntegerField(default=0)),
+                ("no_show", models.IntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("new_customers", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="shops.shop",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Daily shop stats",
+                "unique_together": {("shop", "date")},
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyStaffStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("bookings", models.IntegerField(default=0)),
+                ("minutes", models.IntegerField(default=0)),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_staff_stats",
+                        to="shops.shop",
+                    ),
+                ),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="staff.staff",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Daily staff stats",
+                "unique_together": {("shop", "date", "staff")},
+            },
+        ),
+    ]
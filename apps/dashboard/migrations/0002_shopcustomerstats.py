@@ -0,0 +1,108 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Customers by last visit, newest first and never-visited customers last.
+# PostgreSQL sorts NULLs first in descending order unless told otherwise;
+# SQLite already sorts them last.
+CREATE_RECENT_INDEX = {
+    "postgresql": (
+        'CREATE INDEX "customer_stats_recent_idx" ON "dashboard_shopcustomerstats" '
+        '("shop_id", "last_visit" DESC NULLS LAST, "id")'
+    ),
+    "default": (
+        'CREATE INDEX "customer_stats_recent_idx" ON "dashboard_shopcustomerstats" '
+        '("shop_id", "last_visit" DESC, "id")'
+    ),
+}
+
+DROP_RECENT_INDEX = 'DROP INDEX "customer_stats_recent_idx"'
+
+
+def add_recent_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    schema_editor.execute(CREATE_RECENT_INDEX.get(vendor, CREATE_RECENT_INDEX["default"]))
+
+
+def remove_recent_index(apps, schema_editor):
+    schema_editor.execute(DROP_RECENT_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0001_initial"),
+        ("shops", "0002_shop_schedule_version"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShopCustomerStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=270)),
+                ("name", models.CharField(blank=True, max_length=150)),
+                ("email", models.EmailField(blank=True, max_length=254)),
+                ("phone", models.CharField(blank=True, max_length=20)),
+                ("total_bookings", models.IntegerField(default=0)),
+                ("completed_bookings", models.IntegerField(default=0)),
+                ("cancelled_bookings", models.IntegerField(default=0)),
+                (
+                    "total_spent",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("first_visit", models.DateField(blank=True, null=True)),
+                ("last_visit", models.DateField(blank=True, null=True)),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shop_stats",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="customer_stats",
+                        to="shops.shop",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Shop customer stats",
+                "indexes": [
+                    models.Index(
+                        fields=["shop", "-total_spent", "id"],
+                        name="customer_stats_spent_idx",
+                    ),
+                    models.Index(
+                        fields=["shop", "-total_bookings", "id"],
+                        name="customer_stats_bookings_idx",
+                    ),
+                    models.Index(
+                        fields=["shop", "name", "id"], name="customer_stats_name_idx"
+                    ),
+                    models.Index(
+                        fields=["shop", "first_visit"], name="customer_stats_first_idx"
+                    ),
+                ],
+                "unique_together": {("shop", "key")},
+            },
+        ),
+        migrations.RunPython(add_recent_index, remove_recent_index),
+    ]
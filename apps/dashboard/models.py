@@ -1,4 +1,176 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+from apps.services.models import Service
+from apps.shops.models import Shop
+from apps.staff.models import Staff
+
+
+class DailyShopStats(models.Model):
+    """
+    Bookings of a shop on one day, rolled up for the dashboard (see
+    rollups.py). Counts are by booking status; revenue is the price of
+    completed bookings.
+    """
+
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+    )
+    date = models.DateField()
+
+    pending = models.IntegerField(default=0)
+    confirmed = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    no_show = models.IntegerField(default=0)
+
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # Customers whose first booking at the shop is on this day
+    new_customers = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['shop', 'date']
+        verbose_name_plural = 'Daily shop stats'
+
+    def __str__(self):
+        return f'{self.shop.name} on {self.date}'
+
+    @property
+    def bookings(self):
+        """Bookings that were not cancelled."""
+        return self.pending + self.confirmed + self.completed + self.no_show
+
+
+class DailyServiceStats(models.Model):
+    """Bookings (not cancelled) of a service on one day."""
+
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        related_name='daily_service_stats',
+    )
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+    )
+    date = models.DateField()
+    bookings = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['shop', 'date', 'service']
+        verbose_name_plural = 'Daily service stats'
+
+    def __str__(self):
+        return f'{self.service.name} on {self.date}'
+
+
+class DailyStaffStats(models.Model):
+    """Bookings (not cancelled) and booked minutes of a staff member on one day."""
+
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        related_name='daily_staff_stats',
+    )
+    staff = models.ForeignKey(
+        Staff,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+    )
+    date = models.DateField()
+    bookings = models.IntegerField(default=0)
+    minutes = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['shop', 'date', 'staff']
+        verbose_name_plural = 'Daily staff stats'
+
+    def __str__(self):
+        return f'{self.staff} on {self.date}'
+
+
+class ShopCustomerStats(models.Model):
+    """
+    Lifetime totals of one customer at a shop, for the customers page (see
+    customer_stats.py). A customer is a user account, or else a guest email.
+    """
+
+    class Status(models.TextChoices):
+        VIP = 'vip', 'VIP'
+        REGULAR = 'regular', 'Regular'
+        NEW = 'new', 'New'
+
+    # Customers who spent at least this much are VIPs
+    VIP_MIN_SPENT = Decimal('500')
+    # Customers whose first visit is this recent are new
+    NEW_CUSTOMER_DAYS = 30
+
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        related_name='customer_stats',
+    )
+    # 'customer:<user id>' or 'guest:<lowercased email>' (rollups.customer_key)
+    key = models.CharField(max_length=270)
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='shop_stats',
+    )
+
+    # Contact details, kept in step with the account or the guest booking
+    name = models.CharField(max_length=150, blank=True)
+    email = models.EmailField(blank=True)
+    phone = models.CharField(max_length=20, blank=True)
+
+    # Bookings that were not cancelled
+    total_bookings = models.IntegerField(default=0)
+    completed_bookings = models.IntegerField(default=0)
+    cancelled_bookings = models.IntegerField(default=0)
+    # Price of completed bookings
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # First booking that was not cancelled, and last completed booking
+    first_visit = models.DateField(null=True, blank=True)
+    last_visit = models.DateField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['shop', 'key']
+        verbose_name_plural = 'Shop customer stats'
+        indexes = [
+            # Sorting and filtering on the customers page. Sorting by last
+            # visit, newest first with never-visited customers last, has a
+            # per-database index in migration 0002.
+            models.Index(fields=['shop', '-total_spent', 'id'], name='customer_stats_spent_idx'),
+            models.Index(fields=['shop', '-total_bookings', 'id'], name='customer_stats_bookings_idx'),
+            models.Index(fields=['shop', 'name', 'id'], name='customer_stats_name_idx'),
+            models.Index(fields=['shop', 'first_visit'], name='customer_stats_first_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name or self.email} at {self.shop.name}'
 
+    @classmethod
+    def new_since(cls):
+        """First day on which a first visit still makes a customer new."""
+        return timezone.localdate() - timedelta(days=cls.NEW_CUSTOMER_DAYS)
 
-# Models will be added here
+    @property
+    def status(self):
+        if self.total_spent >= self.VIP_MIN_SPENT:
+            return self.Status.VIP
+        if self.first_visit and self.first_visit >= self.new_since():
+            return self.Status.NEW
+        return self.Status.REGULAR
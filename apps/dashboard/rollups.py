@@ -0,0 +1,389 @@
+"""
+Daily booking rollups behind the dashboard.
+
+DailyShopStats, DailyServiceStats and DailyStaffStats hold per-day totals
+for each shop, so dashboard charts and month-over-month deltas are read
+from a few hundred small rows instead of aggregating the bookings table on
+every load.
+
+Rows are kept live by apply_booking_change(), which signals.py calls when a
+booking is created, saved or deleted. It adds the difference between the
+booking's old and new share of the totals with F() increments, in the
+transaction of the change. rebuild() re-derives a date range from live and
+archived bookings (backfill_dashboard_stats), and reconcile() does the same
+for a shop's dates while logging any drift from the incremental updates.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Min, Q, Sum
+from django.db.models.functions import Lower
+
+from apps.bookings.models import ArchivedBooking, Booking
+
+from . import fragment_cache
+from .models import DailyServiceStats, DailyShopStats, DailyStaffStats
+
+logger = logging.getLogger(__name__)
+
+STATUS_FIELDS = {
+    Booking.Status.PENDING: 'pending',
+    Booking.Status.CONFIRMED: 'confirmed',
+    Booking.Status.COMPLETED: 'completed',
+    Booking.Status.CANCELLED: 'cancelled',
+    Booking.Status.NO_SHOW: 'no_show',
+}
+
+ROLLUP_MODELS = [DailyShopStats, DailyServiceStats, DailyStaffStats]
+
+# Key and total fields of each rollup model
+ROLLUP_KEYS = {
+    DailyShopStats: ('shop_id', 'date'),
+    DailyServiceStats: ('shop_id', 'date', 'service_id'),
+    DailyStaffStats: ('shop_id', 'date', 'staff_id'),
+}
+ROLLUP_VALUES = {
+    DailyShopStats: ('pending', 'confirmed', 'completed', 'cancelled', 'no_show', 'revenue', 'new_customers'),
+    DailyServiceStats: ('bookings',),
+    DailyStaffStats: ('bookings', 'minutes'),
+}
+
+# Booking fields the rollups depend on, in the order of a booking state
+STATE_FIELDS = [
+    'shop_id', 'date', 'status', 'price', 'service_id', 'staff_id',
+    'start_time', 'end_time', 'customer_id', 'guest_email',
+]
+
+REBUILD_CHUNK_SIZE = 5000
+
+
+def booking_minutes(start_time, end_time):
+    """Length of a booking in minutes, wrapping past midnight."""
+    minutes = (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+    return minutes if minutes > 0 else minutes + 24 * 60
+
+
+def customer_key(customer_id, guest_email):
+    """Identify a shop customer: the account, or else the guest email."""
+    if customer_id:
+        return f'customer:{customer_id}'
+    if guest_email:
+        return f'guest:{guest_email.strip().lower()}'
+    return None
+
+
+def booking_state(booking):
+    """The values of STATE_FIELDS of a booking, or None if any is not loaded."""
+    values = booking.__dict__
+    if any(field not in values for field in STATE_FIELDS):
+        return None
+    return tuple(values[field] for field in STATE_FIELDS)
+
+
+def booking_deltas(state):
+    """
+    Yield (model, key, {field: delta}) for one booking's share of the
+    rollups, given its state. Cancelled bookings count only as cancelled.
+    """
+    shop_id, date, status, price, service_id, staff_id, start_time, end_time = state[:8]
+    day = (('shop_id', shop_id), ('date', date))
+    shop_delta = {STATUS_FIELDS[status]: 1}
+    if status == Booking.Status.COMPLETED:
+        shop_delta['revenue'] = Decimal(price)
+    yield DailyShopStats, day, shop_delta
+    if status != Booking.Status.CANCELLED:
+        yield DailyServiceStats, day + (('service_id', service_id),), {'bookings': 1}
+        yield DailyStaffStats, day + (('staff_id', staff_id),), {
+            'bookings': 1,
+            'minutes': booking_minutes(start_time, end_time),
+        }
+
+
+def add_deltas(totals, state, sign=1):
+    """Add (or with sign=-1, subtract) a booking's deltas to {(model, key): {field: total}}."""
+    for model, key, deltas in booking_deltas(state):
+        row = totals[model, key]
+        for field, delta in deltas.items():
+            row[field] = row.get(field, 0) + sign * delta
+
+
+def customers_lookup(key):
+    """Booking filter for a customer key."""
+    kind, value = key.split(':', 1)
+    if kind == 'customer':
+        return {'customer_id': int(value)}
+    return {'customer__isnull': True, 'guest_email__iexact': value}
+
+
+def first_booking_date(shop_id, key, exclude_pk=None):
+    """Date of a customer's first booking at a shop that was not cancelled, or None."""
+    dates = []
+    for model in (Booking, ArchivedBooking):
+        bookings = model.objects.filter(shop_id=shop_id, **customers_lookup(key)).exclude(
+            status=Booking.Status.CANCELLED
+        )
+        if exclude_pk is not None:
+            bookings = bookings.exclude(pk=exclude_pk)
+        dates.append(bookings.order_by().aggregate(first=Min('date'))['first'])
+    dates = [date for date in dates if date]
+    return min(dates) if dates else None
+
+
+def customer_dates(state):
+    """{(shop_id, customer key): date} of a booking that counts towards new customers."""
+    if state is None or state[2] == Booking.Status.CANCELLED:
+        return {}
+    key = customer_key(state[8], state[9])
+    return {(state[0], key): state[1]} if key else {}
+
+
+def add_new_customer_deltas(totals, old, new, pk):
+    """
+    Move a customer's new-customer count when the booking changes which day
+    is their first. Only queries when the booking starts or stops counting,
+    or changes customer or date.
+    """
+    before, after = customer_dates(old), customer_dates(new)
+    for shop_key in before.keys() | after.keys():
+        if before.get(shop_key) == after.get(shop_key):
+            continue
+        shop_id, key = shop_key
+        other = first_booking_date(shop_id, key, exclude_pk=pk)
+        first_before = min(filter(None, [other, before.get(shop_key)]), default=None)
+        first_after = min(filter(None, [other, after.get(shop_key)]), default=None)
+        if first_before == first_after:
+            continue
+        if first_before:
+            row = totals[DailyShopStats, (('shop_id', shop_id), ('date', first_before))]
+            row['new_customers'] = row.get('new_customers', 0) - 1
+        if first_after:
+            row = totals[DailyShopStats, (('shop_id', shop_id), ('date', first_after))]
+            row['new_customers'] = row.get('new_customers', 0) + 1
+
+
+def move_new_customer(shop_key, first_before, first_after):
+    """Move a customer's new-customer count from one first booking date to another (either may be None)."""
+    if first_before == first_after:
+        return
+    shop_id = shop_key[0]
+    if first_before:
+        increment(DailyShopStats, (('shop_id', shop_id), ('date', first_before)), {'new_customers': -1}, create=False)
+    if first_after:
+        increment(DailyShopStats, (('shop_id', shop_id), ('date', first_after)), {'new_customers': 1})
+
+
+def increment(model, key, deltas, create=True):
+    """Add deltas to a rollup row with F() expressions, creating the row if needed and create is set."""
+    key = dict(key)
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**key).update(**updates) or not create:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Created by a concurrent booking in the meantime
+        model.objects.filter(**key).update(**updates)
+
+
+def apply_booking_change(old, new, pk=None, new_customers=True):
+    """
+    Update the rollups for a booking going from state old to state new
+    (None for a booking that did not exist, or was deleted). Run it in the
+    transaction of the change, so the totals commit or roll back with the
+    booking. A deletion never creates rows: rows that are gone were
+    deleted with the booking's shop, service or staff member. Without
+    new_customers, the caller moves new-customer counts itself (see
+    move_new_customer()).
+    """
+    if old == new:
+        return
+    totals = defaultdict(dict)
+    if old is not None:
+        add_deltas(totals, old, sign=-1)
+    if new is not None:
+        add_deltas(totals, new)
+    if new_customers:
+        add_new_customer_deltas(totals, old, new, pk)
+    for (model, key), deltas in totals.items():
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if deltas:
+            increment(model, key, deltas, create=new is not None)
+
+
+def first_booking_dates(start, end, shop_ids=None):
+    """
+    Return {(shop_id, customer key): date} for customers whose first
+    booking that was not cancelled falls in [start, end].
+    """
+    counted = {}
+    for model in (Booking, ArchivedBooking):
+        bookings = model.objects.exclude(status=Booking.Status.CANCELLED).order_by()
+        if shop_ids is not None:
+            bookings = bookings.filter(shop_id__in=shop_ids)
+        counted[model] = bookings
+
+    # Only customers with a counted booking in [start, end] can have their
+    # first one there, so the grouping skips everyone else
+    customers, guest_emails = Q(), Q()
+    for bookings in counted.values():
+        in_range = bookings.filter(date__gte=start, date__lte=end)
+        customers |= Q(customer_id__in=in_range.filter(customer__isnull=False).values('customer_id'))
+        guest_emails |= Q(email__in=in_range.filter(customer__isnull=True).values(email=Lower('guest_email')))
+
+    first_dates = {}
+    for bookings in counted.values():
+        registered = (
+            bookings.filter(customers)
+            .values_list('shop_id', 'customer_id')
+            .annotate(first=Min('date'))
+        )
+        guests = (
+            bookings.filter(customer__isnull=True).exclude(guest_email='')
+            .annotate(email=Lower('guest_email')).filter(guest_emails)
+            .values_list('shop_id', 'email')
+            .annotate(first=Min('date'))
+        )
+        for shop_id, customer_id, first in registered:
+            key = (shop_id, customer_key(customer_id, None))
+            first_dates[key] = min(first, first_dates.get(key, first))
+        for shop_id, email, first in guests:
+            key = (shop_id, customer_key(None, email))
+            first_dates[key] = min(first, first_dates.get(key, first))
+    # Filtered here, as a customer's first live booking may follow an archived one
+    return {key: first for key, first in first_dates.items() if start <= first <= end}
+
+
+def derive(start, end, shop_ids=None):
+    """Compute the rollup rows of [start, end] from bookings: {(model, key): {field: total}}."""
+    totals = defaultdict(dict)
+    for model in (Booking, ArchivedBooking):
+        bookings = model.objects.filter(date__gte=start, date__lte=end).order_by()
+        if shop_ids is not None:
+            bookings = bookings.filter(shop_id__in=shop_ids)
+        for state in bookings.values_list(*STATE_FIELDS).iterator(chunk_size=REBUILD_CHUNK_SIZE):
+            add_deltas(totals, state)
+    for (shop_id, _), first in first_booking_dates(start, end, shop_ids).items():
+        row = totals[DailyShopStats, (('shop_id', shop_id), ('date', first))]
+        row['new_customers'] = row.get('new_customers', 0) + 1
+    return totals
+
+
+def stored_rows(start, end, shop_ids=None):
+    """Yield (model, rows) of the stored rollup rows of [start, end]."""
+    for model in ROLLUP_MODELS:
+        rows = model.objects.filter(date__gte=start, date__lte=end)
+        if shop_ids is not None:
+            rows = rows.filter(shop_id__in=shop_ids)
+        yield model, rows
+
+
+def write(start, end, totals, shop_ids=None):
+    """Replace the stored rollup rows of [start, end] with totals. Run it in a transaction."""
+    for _, rows in stored_rows(start, end, shop_ids):
+        rows.delete()
+    for model in ROLLUP_MODELS:
+        model.objects.bulk_create(
+            [
+                model(**dict(key), **values)
+                for (row_model, key), values in totals.items()
+                if row_model is model
+            ],
+            batch_size=1000,
+        )
+    shop_ids = set(shop_ids or ()) | {key[0][1] for _, key in totals}
+    transaction.on_commit(lambda: bump_fragments(shop_ids))
+
+
+def bump_fragments(shop_ids):
+    """Invalidate every cached dashboard fragment of the shops."""
+    for shop_id in shop_ids:
+        fragment_cache.bump_shop(shop_id, history=True)
+
+
+def rebuild(start, end, shop_ids=None):
+    """
+    Re-derive the rollup rows of every day in [start, end] from bookings,
+    replacing existing rows. Returns the number of shop-days written.
+    """
+    with transaction.atomic():
+        totals = derive(start, end, shop_ids)
+        write(start, end, totals, shop_ids)
+    return sum(1 for model, _ in totals if model is DailyShopStats)
+
+
+def reconcile(start, end, shop_ids=None):
+    """
+    Re-derive the rollups of [start, end] from bookings and log every row
+    that drifted from the incremental updates, then store the derived rows.
+    Returns the number of drifted rows.
+    """
+    drifted = 0
+    with transaction.atomic():
+        stored = {}
+        for model, rows in stored_rows(start, end, shop_ids):
+            keys, values = ROLLUP_KEYS[model], ROLLUP_VALUES[model]
+            for row in rows.select_for_update().values_list(*keys, *values):
+                stored[model, tuple(zip(keys, row))] = dict(zip(values, row[len(keys):]))
+        expected = derive(start, end, shop_ids)
+        for model, key in stored.keys() | expected.keys():
+            have, want = stored.get((model, key), {}), expected.get((model, key), {})
+            if any(have.get(field, 0) != want.get(field, 0) for field in ROLLUP_VALUES[model]):
+                drifted += 1
+                logger.warning(f'{model.__name__} drift at {dict(key)}: stored {have}, derived {want}')
+        if drifted:
+            write(start, end, expected, shop_ids)
+    return drifted
+
+
+def booking_date_range(shop_ids=None):
+    """Return the (first, last) booking dates across live and archived bookings."""
+    dates = []
+    for model in (Booking, ArchivedBooking):
+        bookings = model.objects.order_by()
+        if shop_ids is not None:
+            bookings = bookings.filter(shop_id__in=shop_ids)
+        dates += bookings.aggregate(first=Min('date'), last=Max('date')).values()
+    dates = [date for date in dates if date]
+    return (min(dates), max(dates)) if dates else (None, None)
+
+
+def month_totals(shop, first_month, months):
+    """
+    Return a dict per month from first_month on, with bookings (not
+    cancelled), revenue, new customers and bookings per weekday.
+    """
+    end = first_month + relativedelta(months=months)
+    totals = [
+        {'month': first_month + relativedelta(months=offset), 'bookings': 0, 'revenue': Decimal('0'),
+         'new_customers': 0, 'weekdays': [0] * 7}
+        for offset in range(months)
+    ]
+    rows = DailyShopStats.objects.filter(shop=shop, date__gte=first_month, date__lt=end)
+    for row in rows:
+        month = totals[(row.date.year - first_month.year) * 12 + row.date.month - first_month.month]
+        month['bookings'] += row.bookings
+        month['revenue'] += row.revenue
+        month['new_customers'] += row.new_customers
+        month['weekdays'][row.date.weekday()] += row.bookings
+    return totals
+
+
+def customers_before(shop, date):
+    """Number of distinct customers with a booking before date."""
+    return DailyShopStats.objects.filter(shop=shop, date__lt=date).aggregate(
+        total=Sum('new_customers')
+    )['total'] or 0
+
+
+def service_breakdown(shop, start, end):
+    """Return [(service name, bookings)] for [start, end), most booked first."""
+    return list(
+        DailyServiceStats.objects.filter(shop=shop, date__gte=start, date__lt=end)
+        .values_list('service__name')
+        .annotate(total=Sum('bookings'))
+        .order_by('-total')
+    )
@@ -0,0 +1,117 @@
+"""
+Signal handlers that keep the dashboard rollups, customer totals and
+fragment cache in step with bookings, services, staff and customers.
+
+Booking.save() runs its post_save receivers in the transaction of the save,
+so the F() increments commit or roll back with the booking. Deleted live
+and archived bookings are subtracted, but archival itself changes nothing:
+archived bookings still count.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.bookings import archive
+from apps.bookings.models import ArchivedBooking, Booking
+from apps.services.models import Service
+from apps.staff.models import Staff
+
+from . import customer_stats, fragment_cache, rollups
+
+
+def load_state(booking):
+    """Read a booking's rollup state from the database, for partly loaded instances."""
+    return Booking.objects.filter(pk=booking.pk).values_list(*rollups.STATE_FIELDS).first()
+
+
+@receiver(post_init, sender=Booking)
+def remember_rollup_state(sender, instance, **kwargs):
+    instance._rollup_state = rollups.booking_state(instance)
+
+
+@receiver(pre_save, sender=Booking)
+def load_rollup_state(sender, instance, **kwargs):
+    # Instances loaded with only() or defer() have no state to diff against
+    if not instance._state.adding and instance._rollup_state is None:
+        instance._rollup_state = load_state(instance)
+
+
+@receiver(post_save, sender=Booking)
+def update_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else instance._rollup_state
+    new = rollups.booking_state(instance) or load_state(instance)
+    rollups.apply_booking_change(old, new, pk=instance.pk)
+    customer_stats.apply_customer_change(old, new, instance)
+    instance._rollup_state = new
+
+    # Past months' fragments only change when a booking dated in them does
+    current_month = timezone.localdate().replace(day=1)
+    history = any(state[1] < current_month for state in (old, new) if state)
+    transaction.on_commit(lambda: fragment_cache.bump_shop(instance.shop_id, history=history))
+
+
+def deleted_state(instance):
+    """The rollup state of a live or archived booking being deleted, or None if it is left alone."""
+    if isinstance(instance, ArchivedBooking):
+        return rollups.booking_state(instance)
+    if archive.archiving.get():
+        return None
+    # None for partly loaded instances, which reconcile() corrects
+    return instance._rollup_state
+
+
+@receiver(pre_delete, sender=Booking)
+@receiver(pre_delete, sender=ArchivedBooking)
+def remember_first_dates(sender, instance, origin=None, **kwargs):
+    """
+    delete() removes all bookings of a model before their post_delete, so
+    the customers' first booking dates are read up front, once per delete().
+    """
+    state = deleted_state(instance)
+    if state is None:
+        return
+    first_dates = origin.__dict__.setdefault('_rollup_first_dates', {})
+    for shop_key in rollups.customer_dates(state):
+        if shop_key not in first_dates:
+            first_dates[shop_key] = rollups.first_booking_date(*shop_key)
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=ArchivedBooking)
+def remove_from_rollups(sender, instance, origin=None, **kwargs):
+    old = deleted_state(instance)
+    if old is None:
+        return
+    rollups.apply_booking_change(old, None, pk=instance.pk, new_customers=False)
+    customer_stats.apply_customer_change(old, None, instance)
+    # Once per customer and model, as live and archived bookings go in turn
+    first_dates = origin.__dict__.get('_rollup_first_dates', {})
+    moved = origin.__dict__.setdefault('_rollup_first_dates_moved', set())
+    for shop_key in rollups.customer_dates(old):
+        if shop_key in first_dates and (shop_key, sender) not in moved:
+            moved.add((shop_key, sender))
+            first_date = rollups.first_booking_date(*shop_key)
+            rollups.move_new_customer(shop_key, first_dates[shop_key], first_date)
+            first_dates[shop_key] = first_date
+    history = old[1] < timezone.localdate().replace(day=1)
+    transaction.on_commit(lambda: fragment_cache.bump_shop(instance.shop_id, history=history))
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+def invalidate_dashboard(sender, instance, **kwargs):
+    transaction.on_commit(lambda: fragment_cache.bump_shop(instance.shop_id, history=True))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_customer_stats_details(sender, instance, update_fields=None, **kwargs):
+    """Keep the customers page in step with the customer's name, email and phone."""
+    if update_fields is not None and not {'first_name', 'last_name', 'email', 'phone'} & set(update_fields):
+        return
+    customer_stats.refresh_customer_details(instance)
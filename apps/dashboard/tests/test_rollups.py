@@ -0,0 +1,133 @@
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.bookings import archive
+from apps.bookings.models import ArchivedBooking, Booking
+from apps.dashboard import rollups
+from apps.dashboard.models import DailyServiceStats, DailyShopStats, DailyStaffStats
+from apps.services.models import Service
+from apps.shops.models import Shop
+from apps.staff.models import Staff
+
+
+class RollupSignalTests(TestCase):
+    """Incremental rollup updates always match a rebuild from the bookings."""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(email='owner@example.com', password='password')
+        cls.shop = Shop.objects.create(
+            owner=owner, name='Shop', slug='shop', email='shop@example.com',
+            phone='1', address='Street 1', city='City', postal_code='1000',
+        )
+        cls.cut = Service.objects.create(shop=cls.shop, name='Cut', duration=30, price=Decimal('20'))
+        cls.colour = Service.objects.create(shop=cls.shop, name='Colour', duration=60, price=Decimal('50'))
+        cls.anna = Staff.objects.create(
+            user=User.objects.create_user(email='anna@example.com', password='password'), shop=cls.shop,
+        )
+        cls.ben = Staff.objects.create(
+            user=User.objects.create_user(email='ben@example.com', password='password'), shop=cls.shop,
+        )
+        cls.customer = User.objects.create_user(email='customer@example.com', password='password')
+        cls.today = timezone.now().date()
+
+    def book(self, days, service=None, staff=None, status=Booking.Status.CONFIRMED, **fields):
+        service = service or self.cut
+        fields.setdefault('guest_email', 'guest@example.com')
+        return Booking.objects.create(
+            shop=self.shop, service=service, staff=staff or self.anna,
+            date=self.today + timedelta(days=days), start_time=time(10), end_time=time(10, 30),
+            status=status, price=service.price, **fields,
+        )
+
+    def shop_stats(self, days):
+        stats = DailyShopStats.objects.filter(shop=self.shop, date=self.today + timedelta(days=days)).first()
+        if stats is None:
+            return {}
+        return {field: getattr(stats, field) for field in rollups.ROLLUP_VALUES[DailyShopStats]}
+
+    def assertReconciled(self):
+        start, end = self.today - timedelta(days=800), self.today + timedelta(days=60)
+        self.assertEqual(rollups.reconcile(start, end), 0)
+
+    def test_create(self):
+        self.book(1, status=Booking.Status.COMPLETED)
+        self.book(1, service=self.colour, staff=self.ben)
+        self.book(2)
+        self.book(2, customer=self.customer, guest_email='')
+
+        self.assertEqual(self.shop_stats(1), {
+            'pending': 0, 'confirmed': 1, 'completed': 1, 'cancelled': 0, 'no_show': 0,
+            'revenue': Decimal('20'), 'new_customers': 1,
+        })
+        self.assertEqual(self.shop_stats(2)['new_customers'], 1)
+        staff_stats = DailyStaffStats.objects.get(staff=self.ben, date=self.today + timedelta(days=1))
+        self.assertEqual((staff_stats.bookings, staff_stats.minutes), (1, 30))
+        self.assertReconciled()
+
+    def test_move(self):
+        first = self.book(1)
+        self.book(3)
+
+        first.date = self.today + timedelta(days=5)
+        first.service = self.colour
+        first.staff = self.ben
+        first.save()
+
+        self.assertEqual(self.shop_stats(1).get('confirmed', 0), 0)
+        self.assertEqual(self.shop_stats(3)['new_customers'], 1)
+        self.assertEqual(self.shop_stats(5)['new_customers'], 0)
+        self.assertFalse(DailyServiceStats.objects.filter(service=self.cut, date=first.date, bookings__gt=0).exists())
+        self.assertReconciled()
+
+    def test_cancel_and_complete(self):
+        cancelled = self.book(1)
+        completed = self.book(1, guest_email='other@example.com')
+
+        cancelled.cancel('Ill')
+        completed.complete()
+
+        stats = self.shop_stats(1)
+        self.assertEqual((stats['confirmed'], stats['cancelled'], stats['completed']), (0, 1, 1))
+        self.assertEqual(stats['revenue'], Decimal('20'))
+        self.assertEqual(DailyServiceStats.objects.get(service=self.cut, date=cancelled.date).bookings, 1)
+        self.assertReconciled()
+
+    def test_delete(self):
+        first = self.book(1)
+        self.book(2)
+        self.book(2, guest_email='other@example.com')
+        self.book(3, service=self.colour)
+
+        first.delete()
+        self.assertEqual(self.shop_stats(2)['new_customers'], 2)
+        self.assertReconciled()
+
+        Booking.objects.filter(date=self.today + timedelta(days=2)).delete()
+        self.assertEqual(self.shop_stats(2)['confirmed'], 0)
+        self.assertEqual(self.shop_stats(3)['new_customers'], 1)
+        self.assertReconciled()
+
+        # Cascades from the service
+        self.colour.delete()
+        self.assertEqual(self.shop_stats(3).get('new_customers', 0), 0)
+        self.assertReconciled()
+
+    def test_archive_keeps_and_delete_removes_archived_bookings(self):
+        days_ago = (archive.archive_cutoff() - self.today).days - 10
+        self.book(days_ago, status=Booking.Status.COMPLETED)
+        self.book(1)
+        before = self.shop_stats(days_ago)
+
+        self.assertEqual(archive.archive_bookings(), 1)
+        self.assertEqual(self.shop_stats(days_ago), before)
+        self.assertReconciled()
+
+        ArchivedBooking.objects.all().delete()
+        self.assertEqual(self.shop_stats(days_ago)['completed'], 0)
+        self.assertEqual(self.shop_stats(1)['new_customers'], 1)
+        self.assertReconciled()
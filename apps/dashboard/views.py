@@ -1,171 +1,221 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, Lower
 from django.shortcuts import render
-from datetime import datetime, timedelta
-import random
+from django.utils import timezone
+from django.utils.timesince import timesince
 
+from apps.bookings.models import ArchivedBooking, Booking
 
-def get_mock_data_for_month(month_offset=0):
-    """Generate consistent mock data for a given month offset (0 = current month, -1 = last month, etc.)"""
-    # Use month_offset as seed for consistent random data per month
-    random.seed(42 + month_offset)
-    
-    base_revenue = 8000 + (month_offset * 500)
-    base_bookings = 80 + (month_offset * 5)
-    base_customers = 1200 + (month_offset * 50)
-    
-    stats = {
-        'today_appointments': random.randint(8, 18),
-        'upcoming_bookings': random.randint(35, 60),
-        'total_customers': base_customers + random.randint(0, 100),
-        'monthly_revenue': base_revenue + random.randint(0, 4000),
-        'today_change': random.randint(5, 25),
-        'bookings_change': random.randint(-5, 15),
-        'customers_change': random.randint(5, 20),
-        'revenue_change': random.randint(10, 35),
+from . import fragment_cache, rollups
+from .models import ShopCustomerStats
+
+CHART_MONTHS = 6
+
+TOP_SERVICES = 4
+
+SERVICE_COLORS = ['#533483', '#7c4dab', '#e94560', '#f06b7e', '#f8a5b3']
+
+CUSTOMER_PAGE_SIZE = 24
+
+# Each matches an index on ShopCustomerStats
+CUSTOMER_SORTS = {
+    'recent': [F('last_visit').desc(nulls_last=True), 'id'],
+    'spent': ['-total_spent', 'id'],
+    'bookings': ['-total_bookings', 'id'],
+    'name': ['name', 'id'],
+}
+
+CUSTOMER_STATUS_CLASSES = {
+    ShopCustomerStats.Status.VIP: 'bg-purple-100 text-purple-800',
+    ShopCustomerStats.Status.REGULAR: 'bg-blue-100 text-blue-800',
+    ShopCustomerStats.Status.NEW: 'bg-green-100 text-green-800',
+}
+
+ACTIVITY_STYLES = {
+    Booking.Status.PENDING: ('New booking', 'calendar', 'indigo'),
+    Booking.Status.CONFIRMED: ('Booking confirmed', 'calendar', 'indigo'),
+    Booking.Status.COMPLETED: ('Appointment completed', 'dollar', 'green'),
+    Booking.Status.CANCELLED: ('Booking cancelled', 'x', 'red'),
+    Booking.Status.NO_SHOW: ('Customer did not show', 'user', 'yellow'),
+}
+
+
+def percent_change(current, previous):
+    """Whole-number percentage change from previous to current."""
+    if not previous:
+        return 100 if current else 0
+    return round((current - previous) * 100 / previous)
+
+
+def get_service_distribution(shop, start, end):
+    """The month's most booked services, with the rest grouped as Other."""
+    breakdown = rollups.service_breakdown(shop, start, end)
+    services = [{'name': name, 'count': count} for name, count in breakdown[:TOP_SERVICES]]
+    other = sum(count for _, count in breakdown[TOP_SERVICES:])
+    if other:
+        services.append({'name': 'Other', 'count': other})
+    for service, color in zip(services, SERVICE_COLORS):
+        service['color'] = color
+    return services
+
+
+def get_upcoming(shop, now):
+    """The next five active bookings today."""
+    bookings = (
+        Booking.objects.filter(shop=shop, date=now.date(), start_time__gte=now.time())
+        .filter(status__in=[Booking.Status.PENDING, Booking.Status.CONFIRMED])
+        .select_related('customer', 'service')
+        .order_by('start_time')[:5]
+    )
+    return [
+        {
+            'time': booking.start_time.strftime('%I:%M %p'),
+            'customer': booking.customer_display_name,
+            'service': booking.service.name,
+            'duration': f'{rollups.booking_minutes(booking.start_time, booking.end_time)} min',
+        }
+        for booking in bookings
+    ]
+
+
+def get_activities(shop, now):
+    """The shop's most recently created or changed bookings."""
+    bookings = (
+        Booking.objects.filter(shop=shop, date__gte=now.date() - timedelta(days=30))
+        .select_related('customer', 'service')
+        .order_by('-updated_at')[:6]
+    )
+    activities = []
+    for booking in bookings:
+        title, icon, color = ACTIVITY_STYLES[booking.status]
+        if booking.status == Booking.Status.COMPLETED:
+            description = f'${booking.price} from {booking.customer_display_name}'
+        else:
+            description = f'{booking.customer_display_name} - {booking.service.name}'
+        activities.append({
+            'icon': icon,
+            'color': color,
+            'title': title,
+            'description': description,
+            'time': f'{timesince(booking.updated_at, now).split(",")[0]} ago',
+        })
+    return activities
+
+
+def get_month_fragment(shop, selected_month):
+    """Stat cards and charts of a month, read from the rollups."""
+    # Chart window ends at the selected month; the month before it gives the deltas
+    totals = rollups.month_totals(shop, selected_month - relativedelta(months=CHART_MONTHS - 1), CHART_MONTHS)
+    month, previous = totals[-1], totals[-2]
+    customers_before = rollups.customers_before(shop, selected_month)
+    return {
+        'stats': {
+            'total_customers': customers_before + month['new_customers'],
+            'monthly_revenue': month['revenue'],
+            'bookings_change': percent_change(month['bookings'], previous['bookings']),
+            'customers_change': percent_change(month['new_customers'] + customers_before, customers_before),
+            'revenue_change': percent_change(month['revenue'], previous['revenue']),
+        },
+        'months': [month['month'].strftime('%b') for month in totals],
+        'revenue_data': [float(month['revenue']) for month in totals],
+        'bookings_data': [month['bookings'] for month in totals],
+        'weekly_appointments': month['weekdays'],
+        'services': get_service_distribution(shop, selected_month, selected_month + relativedelta(months=1)),
+    }
+
+
+def get_today_fragment(shop, now):
+    """Today's stat cards, schedule and recent activity, read from live bookings."""
+    today = now.date()
+    last_week = today - timedelta(days=7)
+    day_counts = Booking.objects.filter(shop=shop, date__in=[today, last_week]).exclude(
+        status=Booking.Status.CANCELLED
+    ).aggregate(
+        today=Count('pk', filter=Q(date=today)),
+        last_week=Count('pk', filter=Q(date=last_week)),
+    )
+    return {
+        'stats': {
+            'today_appointments': day_counts['today'],
+            'upcoming_bookings': Booking.objects.filter(shop=shop).upcoming().count(),
+            'today_change': percent_change(day_counts['today'], day_counts['last_week']),
+        },
+        'upcoming': get_upcoming(shop, now),
+        'activities': get_activities(shop, now),
     }
-    
-    # Reset seed for other random data
-    random.seed()
-    
-    return stats
 
 
 @login_required
 def index_view(request):
-    """Main dashboard view with mock data."""
-    
-    today = datetime.now()
-    
-    # Get selected month from query params (0 = current, -1 = last month, etc.)
-    selected_month_offset = int(request.GET.get('month', 0))
-    
-    # Calculate the selected month date
-    selected_date = today
-    for _ in range(abs(selected_month_offset)):
-        if selected_month_offset < 0:
-            selected_date = selected_date.replace(day=1) - timedelta(days=1)
-    
-    selected_month_name = selected_date.strftime('%B %Y')
-    
-    # Generate list of past 6 months for dropdown
+    """
+    Main dashboard. Monthly figures and charts are read from the daily
+    rollups (see rollups.py), today's schedule from live bookings, both
+    through the shop's fragment cache (see fragment_cache.py).
+    """
+    now = timezone.localtime()
+    shop = request.user.owned_shops.first()
+
+    # Selected month (0 = current, -1 = last month, etc.)
+    try:
+        selected_month_offset = max(1 - CHART_MONTHS, min(0, int(request.GET.get('month', 0))))
+    except ValueError:
+        selected_month_offset = 0
+    current_month = now.date().replace(day=1)
+    selected_month = current_month + relativedelta(months=selected_month_offset)
+
+    # Past months for the dropdown
     available_months = []
-    temp_date = today
-    for i in range(6):
+    for i in range(CHART_MONTHS):
+        month = current_month - relativedelta(months=i)
         available_months.append({
             'offset': -i,
-            'name': temp_date.strftime('%B %Y'),
-            'short_name': temp_date.strftime('%b %Y'),
+            'name': month.strftime('%B %Y'),
+            'short_name': month.strftime('%b %Y'),
         })
-        temp_date = temp_date.replace(day=1) - timedelta(days=1)
-    
-    # Monthly revenue data (last 6 months from selected month)
-    months = []
-    revenue_data = []
-    bookings_data = []
-    random.seed(100 + selected_month_offset)
-    for i in range(5, -1, -1):
-        month_date = selected_date - timedelta(days=30*i)
-        months.append(month_date.strftime('%b'))
-        revenue_data.append(random.randint(2500, 8500))
-        bookings_data.append(random.randint(45, 120))
-    random.seed()
-    
-    # Weekly appointments data
-    days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    random.seed(200 + selected_month_offset)
-    weekly_appointments = [random.randint(8, 25) for _ in days]
-    random.seed()
-    
-    # Service distribution
-    random.seed(300 + selected_month_offset)
-    services = [
-        {'name': 'Haircut', 'count': random.randint(100, 180), 'color': '#533483'},
-        {'name': 'Massage', 'count': random.randint(70, 120), 'color': '#7c4dab'},
-        {'name': 'Facial', 'count': random.randint(50, 90), 'color': '#e94560'},
-        {'name': 'Manicure', 'count': random.randint(30, 70), 'color': '#f06b7e'},
-        {'name': 'Other', 'count': random.randint(20, 50), 'color': '#f8a5b3'},
-    ]
-    random.seed()
-    
-    # Recent activities mock data
-    activities = [
-        {
-            'type': 'booking',
-            'icon': 'calendar',
-            'color': 'indigo',
-            'title': 'New booking confirmed',
-            'description': 'Sarah Johnson booked a Haircut',
-            'time': '5 minutes ago',
-        },
-        {
-            'type': 'payment',
-            'icon': 'dollar',
-            'color': 'green',
-            'title': 'Payment received',
-            'description': '$85.00 from Michael Smith',
-            'time': '23 minutes ago',
-        },
-        {
-            'type': 'customer',
-            'icon': 'user',
-            'color': 'purple',
-            'title': 'New customer registered',
-            'description': 'Emily Davis created an account',
-            'time': '1 hour ago',
-        },
-        {
-            'type': 'booking',
-            'icon': 'calendar',
-            'color': 'indigo',
-            'title': 'Appointment completed',
-            'description': 'Massage session with John Doe',
-            'time': '2 hours ago',
-        },
-        {
-            'type': 'review',
-            'icon': 'star',
-            'color': 'yellow',
-            'title': 'New 5-star review',
-            'description': 'Amanda Lee left a review',
-            'time': '3 hours ago',
-        },
-        {
-            'type': 'cancellation',
-            'icon': 'x',
-            'color': 'red',
-            'title': 'Booking cancelled',
-            'description': 'Robert Wilson cancelled Facial',
-            'time': '4 hours ago',
-        },
-    ]
-    
-    # Upcoming appointments
-    upcoming = [
-        {'time': '09:00 AM', 'customer': 'Alice Brown', 'service': 'Haircut', 'duration': '45 min'},
-        {'time': '10:00 AM', 'customer': 'James Wilson', 'service': 'Massage', 'duration': '60 min'},
-        {'time': '11:30 AM', 'customer': 'Emma Taylor', 'service': 'Facial', 'duration': '30 min'},
-        {'time': '01:00 PM', 'customer': 'Oliver Martinez', 'service': 'Haircut', 'duration': '45 min'},
-        {'time': '02:30 PM', 'customer': 'Sophia Anderson', 'service': 'Manicure', 'duration': '40 min'},
-    ]
-    
-    # Get stats for selected month
-    stats = get_mock_data_for_month(selected_month_offset)
-    
+
+    if shop:
+        # Past months no longer change with today's bookings
+        past = selected_month < current_month
+        month_fragment = fragment_cache.get_fragment(
+            shop.pk,
+            f'month:{selected_month:%Y-%m}',
+            lambda: get_month_fragment(shop, selected_month),
+            history=past,
+            timeout=fragment_cache.HISTORY_CACHE_TIMEOUT if past else fragment_cache.LIVE_CACHE_TIMEOUT,
+        )
+        # Keyed by the minute, as today's schedule drops appointments once they start
+        today_fragment = fragment_cache.get_fragment(
+            shop.pk,
+            f'today:{now:%Y-%m-%dT%H:%M}',
+            lambda: get_today_fragment(shop, now),
+            timeout=fragment_cache.TODAY_CACHE_TIMEOUT,
+        )
+    else:
+        month_fragment = get_month_fragment(None, selected_month)
+        today_fragment = get_today_fragment(None, now)
+
     context = {
-        'selected_month_name': selected_month_name,
+        'selected_month_name': selected_month.strftime('%B %Y'),
         'selected_month_offset': selected_month_offset,
         'available_months': available_months,
-        'months': months,
-        'revenue_data': revenue_data,
-        'bookings_data': bookings_data,
-        'days': days,
-        'weekly_appointments': weekly_appointments,
-        'services': services,
-        'activities': activities,
-        'upcoming': upcoming,
-        'stats': stats,
+        'months': month_fragment['months'],
+        'revenue_data': month_fragment['revenue_data'],
+        'bookings_data': month_fragment['bookings_data'],
+        'days': ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+        'weekly_appointments': month_fragment['weekly_appointments'],
+        'services': month_fragment['services'],
+        'activities': today_fragment['activities'],
+        'upcoming': today_fragment['upcoming'],
+        'stats': {**month_fragment['stats'], **today_fragment['stats']},
     }
-    
+
     return render(request, 'dashboard/index.html', context)
 
 
@@ -398,144 +448,118 @@ def staff_view(request):
     return render(request, 'dashboard/staff.html', context)
 
 
+def filter_customer_status(customers, status):
+    """Filter ShopCustomerStats rows to VIP, new or regular customers."""
+    vip = Q(total_spent__gte=ShopCustomerStats.VIP_MIN_SPENT)
+    new = Q(first_visit__gte=ShopCustomerStats.new_since())
+    if status == ShopCustomerStats.Status.VIP:
+        return customers.filter(vip)
+    if status == ShopCustomerStats.Status.NEW:
+        return customers.filter(new).exclude(vip)
+    if status == ShopCustomerStats.Status.REGULAR:
+        return customers.exclude(vip).exclude(new)
+    return customers
+
+
+def get_customer_summary(shop, month_start):
+    """Stat cards of the customers page."""
+    return ShopCustomerStats.objects.filter(shop=shop).aggregate(
+        total_customers=Count('pk'),
+        vip_customers=Count('pk', filter=Q(total_spent__gte=ShopCustomerStats.VIP_MIN_SPENT)),
+        new_this_month=Count('pk', filter=Q(first_visit__gte=month_start)),
+        total_revenue=Coalesce(Sum('total_spent'), Decimal('0')),
+    )
+
+
+def get_favorite_services(shop, customers):
+    """Return {customer key: most booked service name} for a page of customers."""
+    customer_ids = [customer.customer_id for customer in customers if customer.customer_id]
+    emails = [customer.email for customer in customers if not customer.customer_id]
+    counts = defaultdict(int)
+    for model in (Booking, ArchivedBooking):
+        bookings = (
+            model.objects.filter(shop=shop)
+            .exclude(status=Booking.Status.CANCELLED)
+            .annotate(email=Lower('guest_email'))
+            .filter(Q(customer_id__in=customer_ids) | Q(customer__isnull=True, email__in=emails))
+            .order_by()
+            .values_list('customer_id', 'email', 'service__name')
+            .annotate(count=Count('pk'))
+        )
+        for customer_id, email, service, count in bookings:
+            counts[rollups.customer_key(customer_id, email), service] += count
+    favorites, best = {}, {}
+    for (key, service), count in counts.items():
+        if count > best.get(key, 0):
+            favorites[key], best[key] = service, count
+    return favorites
+
+
+def initials(name):
+    return ''.join(part[0] for part in name.split()[:2]).upper() or '?'
+
+
 @login_required
 def customers_view(request):
-    """Customers management view with mock data."""
-    import random
-    from datetime import datetime, timedelta
-    
-    today = datetime.now()
-    random.seed(800)
-    
-    customers = [
-        {
-            'id': 1,
-            'name': 'Alice Brown',
-            'email': 'alice.brown@email.com',
-            'phone': '+1 (555) 111-2222',
-            'avatar_initials': 'AB',
-            'total_bookings': 24,
-            'total_spent': 1250,
-            'last_visit': (today - timedelta(days=3)).strftime('%b %d, %Y'),
-            'favorite_service': 'Haircut',
-            'status': 'vip',
-            'joined': (today - timedelta(days=365)).strftime('%b %Y'),
-        },
-        {
-            'id': 2,
-            'name': 'James Wilson',
-            'email': 'james.w@email.com',
-            'phone': '+1 (555) 222-3333',
-            'avatar_initials': 'JW',
-            'total_bookings': 18,
-            'total_spent': 980,
-            'last_visit': (today - timedelta(days=7)).strftime('%b %d, %Y'),
-            'favorite_service': 'Massage',
-            'status': 'regular',
-            'joined': (today - timedelta(days=280)).strftime('%b %Y'),
-        },
-        {
-            'id': 3,
-            'name': 'Emma Taylor',
-            'email': 'emma.t@email.com',
-            'phone': '+1 (555) 333-4444',
-            'avatar_initials': 'ET',
-            'total_bookings': 31,
-            'total_spent': 1890,
-            'last_visit': (today - timedelta(days=1)).strftime('%b %d, %Y'),
-            'favorite_service': 'Facial',
-            'status': 'vip',
-            'joined': (today - timedelta(days=450)).strftime('%b %Y'),
-        },
-        {
-            'id': 4,
-            'name': 'Oliver Martinez',
-            'email': 'oliver.m@email.com',
-            'phone': '+1 (555) 444-5555',
-            'avatar_initials': 'OM',
-            'total_bookings': 8,
-            'total_spent': 420,
-            'last_visit': (today - timedelta(days=14)).strftime('%b %d, %Y'),
-            'favorite_service': 'Haircut',
-            'status': 'regular',
-            'joined': (today - timedelta(days=120)).strftime('%b %Y'),
-        },
-        {
-            'id': 5,
-            'name': 'Sophia Anderson',
-            'email': 'sophia.a@email.com',
-            'phone': '+1 (555) 555-6666',
-            'avatar_initials': 'SA',
-            'total_bookings': 15,
-            'total_spent': 875,
-            'last_visit': (today - timedelta(days=5)).strftime('%b %d, %Y'),
-            'favorite_service': 'Manicure',
-            'status': 'regular',
-            'joined': (today - timedelta(days=200)).strftime('%b %Y'),
-        },
-        {
-            'id': 6,
-            'name': 'William Davis',
-            'email': 'will.d@email.com',
-            'phone': '+1 (555) 666-7777',
-            'avatar_initials': 'WD',
-            'total_bookings': 3,
-            'total_spent': 145,
-            'last_visit': (today - timedelta(days=30)).strftime('%b %d, %Y'),
-            'favorite_service': 'Beard Trim',
-            'status': 'new',
-            'joined': (today - timedelta(days=45)).strftime('%b %Y'),
-        },
-        {
-            'id': 7,
-            'name': 'Isabella Garcia',
-            'email': 'isabella.g@email.com',
-            'phone': '+1 (555) 777-8888',
-            'avatar_initials': 'IG',
-            'total_bookings': 22,
-            'total_spent': 1560,
-            'last_visit': (today - timedelta(days=2)).strftime('%b %d, %Y'),
-            'favorite_service': 'Hair Coloring',
-            'status': 'vip',
-            'joined': (today - timedelta(days=380)).strftime('%b %Y'),
-        },
-        {
-            'id': 8,
-            'name': 'Mason Rodriguez',
-            'email': 'mason.r@email.com',
-            'phone': '+1 (555) 888-9999',
-            'avatar_initials': 'MR',
-            'total_bookings': 6,
-            'total_spent': 320,
-            'last_visit': (today - timedelta(days=21)).strftime('%b %d, %Y'),
-            'favorite_service': 'Massage',
-            'status': 'regular',
-            'joined': (today - timedelta(days=90)).strftime('%b %Y'),
-        },
-    ]
-    
-    random.seed()
-    
-    status_colors = {
-        'vip': 'bg-purple-100 text-purple-800',
-        'regular': 'bg-blue-100 text-blue-800',
-        'new': 'bg-green-100 text-green-800',
-    }
-    
-    for customer in customers:
-        customer['status_class'] = status_colors[customer['status']]
-    
-    # Stats
-    stats = {
-        'total_customers': len(customers),
-        'vip_customers': sum(1 for c in customers if c['status'] == 'vip'),
-        'new_this_month': sum(1 for c in customers if c['status'] == 'new'),
-        'total_revenue': sum(c['total_spent'] for c in customers),
-    }
-    
+    """
+    Customers of the owner's shop, read from the lifetime totals in
+    ShopCustomerStats (see customer_stats.py).
+    """
+    shop = request.user.owned_shops.first()
+    today = timezone.localdate()
+    query = request.GET.get('q', '').strip()
+    status_filter = request.GET.get('status', 'all')
+    sort = request.GET.get('sort', 'recent')
+    if sort not in CUSTOMER_SORTS:
+        sort = 'recent'
+
+    customers = ShopCustomerStats.objects.filter(shop=shop)
+    if query:
+        customers = customers.filter(Q(name__icontains=query) | Q(email__icontains=query))
+    customers = filter_customer_status(customers, status_filter)
+    page = Paginator(customers.order_by(*CUSTOMER_SORTS[sort]), CUSTOMER_PAGE_SIZE).get_page(request.GET.get('page'))
+
+    favorites = get_favorite_services(shop, page.object_list) if shop else {}
+    rows = []
+    for customer in page.object_list:
+        rows.append({
+            'id': customer.pk,
+            'name': customer.name,
+            'email': customer.email,
+            'phone': customer.phone,
+            'avatar_initials': initials(customer.name or customer.email),
+            'total_bookings': customer.total_bookings,
+            'total_spent': customer.total_spent,
+            'last_visit': customer.last_visit.strftime('%b %d, %Y') if customer.last_visit else 'Never',
+            'favorite_service': favorites.get(customer.key, '-'),
+            'status': customer.status,
+            'status_class': CUSTOMER_STATUS_CLASSES[customer.status],
+            'joined': customer.first_visit.strftime('%b %Y') if customer.first_visit else '-',
+        })
+
+    if shop:
+        month_start = today.replace(day=1)
+        stats = fragment_cache.get_fragment(
+            shop.pk,
+            f'customers:{month_start:%Y-%m}',
+            lambda: get_customer_summary(shop, month_start),
+        )
+    else:
+        stats = {'total_customers': 0, 'vip_customers': 0, 'new_this_month': 0, 'total_revenue': 0}
+
+    # Filters carried over by the pagination links
+    params = request.GET.copy()
+    params.pop('page', None)
+
     context = {
-        'customers': customers,
+        'customers': rows,
+        'page': page,
+        'query_string': params.urlencode(),
+        'query': query,
+        'status_filter': status_filter,
+        'sort': sort,
         'stats': stats,
+        'shop': shop,
     }
-    
-    return render(request, 'dashboard/customers.html', context)
\ No newline at end of file
+
+    return render(request, 'dashboard/customers.html', context)
@@ -1,5 +1,6 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Q
 from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 
@@ -12,7 +13,7 @@ from .models import Service, ServiceCategory
 def get_shop_for_user(request, slug):
     """Get shop and verify ownership."""
     shop = get_object_or_404(Shop, slug=slug)
-    if shop.owner != request.user:
+    if shop.owner_id != request.user.pk:
         raise Http404("Shop not found")
     return shop
 
@@ -21,8 +22,10 @@ def get_shop_for_user(request, slug):
 def service_list_view(request, slug):
     """List all services for a shop."""
     shop = get_shop_for_user(request, slug)
-    services = shop.services.select_related('category').all()
-    categories = shop.service_categories.all()
+    services = shop.services.select_related('category').annotate(
+        active_staff_count=Count('staff_members', filter=Q(staff_members__is_active=True)),
+    )
+    categories = shop.service_categories.annotate(service_count=Count('services'))
 
     return render(request, 'services/list.html', {
         'shop': shop,
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.shops.models import Shop
+
+# Most queries each page may run, whatever the number of staff, services
+# and bookings. Includes the session and user lookups of the request, and
+# compiling the shop schedule when it is not cached yet (staff list).
+# tests/test_query_counts.py checks them on every test run.
+QUERY_BUDGETS = {
+    'staff:list': 8,
+    'services:list': 5,
+    'shops:public': 5,
+}
+
+
+def count_queries(client, url):
+    """Return (status code, executed queries) for a GET request."""
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    return response.status_code, context.captured_queries
+
+
+class Command(BaseCommand):
+    help = 'Check that the staff, service and public shop pages stay within their query budgets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shop', help='Slug of the shop to check (default: the shop with the most staff).')
+        parser.add_argument('--show-sql', action='store_true', help='Print the queries of each page.')
+
+    def handle(self, *args, **options):
+        shops = Shop.objects.select_related('owner')
+        if options['shop']:
+            shop = shops.filter(slug=options['shop']).first()
+        else:
+            shop = shops.alias(staff_total=Count('staff_members')).order_by('-staff_total').first()
+        if shop is None:
+            raise CommandError('No shop found.')
+
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        client = Client(HTTP_HOST=host)
+        client.force_login(shop.owner, backend='django.contrib.auth.backends.ModelBackend')
+
+        over_budget = []
+        for name, budget in QUERY_BUDGETS.items():
+            status, queries = count_queries(client, reverse(name, args=[shop.slug]))
+            if status != 200:
+                raise CommandError(f'{name} returned {status}.')
+            line = f'{name}: {len(queries)} queries (budget {budget})'
+            if len(queries) > budget:
+                over_budget.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+            if options['show_sql'] or len(queries) > budget:
+                for query in queries:
+                    self.stdout.write(f'    {query["sql"]}')
+
+        if over_budget:
+            raise CommandError(f'Over query budget: {", ".join(over_budget)}')
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shops", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shop",
+            name="schedule_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -47,6 +47,9 @@ class Shop(models.Model):
         help_text='Buffer time in minutes between appointments',
     )
 
+    # Bumped on every hours, closure or time-off change (see schedule.py)
+    schedule_version = models.PositiveIntegerField(default=0, editable=False)
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -57,6 +60,17 @@ class Shop(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # schedule_version only moves through the F() updates in schedule.py.
+        # A full save of an instance loaded before a bump would write the old
+        # stamp back and serve a stale compiled schedule again.
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'schedule_version'
+            ]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('shops:detail', kwargs={'slug': self.slug})
 
@@ -0,0 +1,169 @@
+"""
+Compiled weekly schedules for shops.
+
+BusinessHours, StaffWorkingHours and upcoming ShopClosure/StaffTimeOff rows
+change rarely but are read on every availability computation and hours
+display. ShopSchedule compiles them once into minute-offset tuples, and
+get_shop_schedule keeps compiled schedules in a per-worker LRU keyed on
+Shop.schedule_version. The signal handlers in signals.py bump that stamp
+on every write, so a stale schedule is never served.
+"""
+from collections import defaultdict, namedtuple
+from datetime import time
+from functools import lru_cache
+
+from django.db.models import F
+from django.utils import timezone
+
+from apps.staff.models import StaffTimeOff, StaffWorkingHours
+
+from .models import BusinessHours, Shop, ShopClosure
+
+# Compiled schedules kept per worker process
+SCHEDULE_CACHE_SIZE = 256
+
+# Marker for a staff member's day off in ShopSchedule.staff_hours
+DAY_OFF = 'off'
+
+# Display row for a day's hours, mirroring the BusinessHours fields
+HoursRow = namedtuple('HoursRow', ['day_of_week', 'day_name', 'open_time', 'close_time', 'is_closed'])
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute if value else None
+
+
+def _time(minutes):
+    return time(*divmod(minutes, 60)) if minutes is not None else None
+
+
+class ShopSchedule:
+    """
+    Compact, query-free view of a shop's weekly hours and upcoming closures.
+
+    business_hours: 7-tuple indexed by weekday of (open, close) minute
+        offsets, or None when the shop is closed that day.
+    staff_hours: {staff_id: 7-tuple} of (start, end) minute offsets (either
+        may be None to inherit the shop hours), DAY_OFF, or None when the
+        staff member has no row for that weekday.
+    closed_dates: full-day closure dates.
+    closure_intervals: {date: ((start, end), ...)} for partial closures.
+    time_off: {staff_id: ((start_date, end_date), ...)}.
+
+    Only closures and time off ending today or later are compiled.
+    """
+
+    __slots__ = (
+        'shop_id', 'version', 'business_hours', 'staff_hours',
+        'closed_dates', 'closure_intervals', 'time_off',
+    )
+
+    def __init__(self, shop_id, version):
+        self.shop_id = shop_id
+        self.version = version
+        today = timezone.now().date()
+
+        business_hours = [None] * 7
+        for row in BusinessHours.objects.filter(shop_id=shop_id):
+            if not row.is_closed and row.open_time and row.close_time:
+                business_hours[row.day_of_week] = (_minutes(row.open_time), _minutes(row.close_time))
+        self.business_hours = tuple(business_hours)
+
+        staff_hours = defaultdict(lambda: [None] * 7)
+        for row in StaffWorkingHours.objects.filter(staff__shop_id=shop_id):
+            if row.is_day_off:
+                staff_hours[row.staff_id][row.day_of_week] = DAY_OFF
+            else:
+                staff_hours[row.staff_id][row.day_of_week] = (
+                    _minutes(row.start_time), _minutes(row.end_time)
+                )
+        self.staff_hours = {staff_id: tuple(days) for staff_id, days in staff_hours.items()}
+
+        closed_dates = set()
+        closure_intervals = defaultdict(list)
+        for row in ShopClosure.objects.filter(shop_id=shop_id, date__gte=today):
+            if row.is_full_day or not row.start_time or not row.end_time:
+                closed_dates.add(row.date)
+            else:
+                closure_intervals[row.date].append((_minutes(row.start_time), _minutes(row.end_time)))
+        self.closed_dates = frozenset(closed_dates)
+        self.closure_intervals = {date: tuple(rows) for date, rows in closure_intervals.items()}
+
+        time_off = defaultdict(list)
+        rows = StaffTimeOff.objects.filter(
+            staff__shop_id=shop_id,
+            end_date__gte=today,
+        ).values_list('staff_id', 'start_date', 'end_date')
+        for staff_id, start, end in rows:
+            time_off[staff_id].append((start, end))
+        self.time_off = {staff_id: tuple(rows) for staff_id, rows in time_off.items()}
+
+    def shop_window(self, date):
+        """Return (open, close, closure_intervals) for a date, or None if closed."""
+        hours = self.business_hours[date.weekday()]
+        if hours is None or date in self.closed_dates:
+            return None
+        return hours[0], hours[1], self.closure_intervals.get(date, ())
+
+    def staff_window(self, staff_id, date):
+        """
+        Return (open, close, closure_intervals) for a staff member on a date,
+        or None on days off, time off, or when the shop is closed.
+        """
+        window = self.shop_window(date)
+        if window is None:
+            return None
+        open_minute, close_minute, closed = window
+
+        working = self.staff_hours.get(staff_id, (None,) * 7)[date.weekday()]
+        if working == DAY_OFF:
+            return None
+        if working is not None:
+            open_minute = working[0] if working[0] is not None else open_minute
+            close_minute = working[1] if working[1] is not None else close_minute
+
+        if any(start <= date <= end for start, end in self.time_off.get(staff_id, ())):
+            return None
+        return open_minute, close_minute, closed
+
+    def weekly_hours(self):
+        """Return an HoursRow per weekday for displaying business hours."""
+        rows = []
+        for day, name in BusinessHours.DayOfWeek.choices:
+            hours = self.business_hours[day]
+            if hours is None:
+                rows.append(HoursRow(day, name, None, None, True))
+            else:
+                rows.append(HoursRow(day, name, _time(hours[0]), _time(hours[1]), False))
+        return rows
+
+    def staff_day(self, staff_id, date):
+        """Return an HoursRow describing a staff member's hours on a date."""
+        window = self.staff_window(staff_id, date)
+        name = BusinessHours.DayOfWeek(date.weekday()).label
+        if window is None:
+            return HoursRow(date.weekday(), name, None, None, True)
+        return HoursRow(date.weekday(), name, _time(window[0]), _time(window[1]), False)
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def _compile_schedule(shop_id, version):
+    return ShopSchedule(shop_id, version)
+
+
+def get_shop_schedule(shop):
+    """
+    Return the compiled schedule for a shop, compiling it at most once per
+    schedule_version in each worker. Reads no rows when already compiled.
+    """
+    return _compile_schedule(shop.pk, shop.schedule_version)
+
+
+def bump_schedule_version(shop_id):
+    """Mark every compiled schedule for a shop as stale."""
+    Shop.objects.filter(pk=shop_id).update(schedule_version=F('schedule_version') + 1)
+
+
+def bump_staff_schedule_version(staff_id):
+    """Mark the compiled schedule of a staff member's shop as stale."""
+    Shop.objects.filter(staff_members=staff_id).update(schedule_version=F('schedule_version') + 1)
@@ -0,0 +1,26 @@
+"""
+Signal handlers that keep compiled shop schedules current.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.staff.models import StaffTimeOff, StaffWorkingHours
+
+from .models import BusinessHours, ShopClosure
+from .schedule import bump_schedule_version, bump_staff_schedule_version
+
+
+@receiver(post_save, sender=BusinessHours)
+@receiver(post_delete, sender=BusinessHours)
+@receiver(post_save, sender=ShopClosure)
+@receiver(post_delete, sender=ShopClosure)
+def invalidate_shop_schedule(sender, instance, **kwargs):
+    bump_schedule_version(instance.shop_id)
+
+
+@receiver(post_save, sender=StaffWorkingHours)
+@receiver(post_delete, sender=StaffWorkingHours)
+@receiver(post_save, sender=StaffTimeOff)
+@receiver(post_delete, sender=StaffTimeOff)
+def invalidate_staff_schedule(sender, instance, **kwargs):
+    bump_staff_schedule_version(instance.staff_id)
@@ -0,0 +1,73 @@
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.bookings.models import Booking
+from apps.services.models import Service
+from apps.shops.management.commands.check_query_counts import QUERY_BUDGETS
+from apps.shops.models import BusinessHours, Shop
+from apps.staff.models import Staff, StaffService, StaffWorkingHours
+
+
+class QueryCountTests(TestCase):
+    """The staff, service and public shop pages run a fixed number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            email='owner@example.com', password='password', is_active=True, role=User.Role.ADMIN,
+        )
+        cls.shop = Shop.objects.create(
+            owner=cls.owner, name='Shop', slug='shop', email='shop@example.com',
+            phone='1', address='Street 1', city='City', postal_code='1000',
+        )
+        for day in range(7):
+            BusinessHours.objects.create(shop=cls.shop, day_of_week=day, open_time=time(9), close_time=time(17))
+        cls.add_catalog(1)
+
+    @classmethod
+    def add_catalog(cls, count):
+        """Add count staff members and services, each with a few bookings."""
+        start = Staff.objects.count()
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        for i in range(start, start + count):
+            user = User.objects.create_user(email=f'staff{i}@example.com', password='password', first_name=f'Staff {i}')
+            staff = Staff.objects.create(user=user, shop=cls.shop)
+            service = Service.objects.create(shop=cls.shop, name=f'Service {i}', duration=30, price=Decimal('20'))
+            StaffService.objects.create(staff=staff, service=service)
+            for day in range(7):
+                StaffWorkingHours.objects.create(staff=staff, day_of_week=day, start_time=time(9), end_time=time(17))
+            for hour in range(9, 12):
+                Booking.objects.create(
+                    shop=cls.shop, staff=staff, service=service, date=tomorrow,
+                    start_time=time(hour), end_time=time(hour, 30), price=service.price,
+                    guest_name='Guest', guest_email=f'guest{i}@example.com',
+                )
+
+    def setUp(self):
+        self.client.force_login(self.owner, backend='django.contrib.auth.backends.ModelBackend')
+
+    def count_queries(self, name):
+        # Start from a cold cache, so the schedule is compiled on every run
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(name, args=[self.shop.slug]))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_counts_do_not_grow_with_the_shop(self):
+        counts = {name: self.count_queries(name) for name in QUERY_BUDGETS}
+        self.add_catalog(5)
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(page=name):
+                self.assertLessEqual(counts[name], budget)
+                cache.clear()
+                with self.assertNumQueries(counts[name]):
+                    self.client.get(reverse(name, args=[self.shop.slug]))
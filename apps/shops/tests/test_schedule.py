@@ -0,0 +1,33 @@
+from datetime import time
+
+from django.test import TestCase
+
+from apps.accounts.models import User
+from apps.shops.models import BusinessHours, Shop
+from apps.shops.schedule import _compile_schedule, get_shop_schedule
+
+
+class ScheduleVersionTests(TestCase):
+    """Saving a shop never rolls its schedule_version back."""
+
+    def setUp(self):
+        # Compiled schedules outlive the rolled back rows of earlier tests
+        _compile_schedule.cache_clear()
+        owner = User.objects.create_user(email='owner@example.com', password='password')
+        self.shop = Shop.objects.create(
+            owner=owner, name='Shop', slug='shop', email='shop@example.com',
+            phone='1', address='Street 1', city='City', postal_code='1000',
+        )
+
+    def test_full_save_of_a_stale_shop_keeps_the_new_version(self):
+        stale = Shop.objects.get(pk=self.shop.pk)
+        self.assertIsNone(get_shop_schedule(stale).business_hours[0])
+        BusinessHours.objects.create(shop=self.shop, day_of_week=0, open_time=time(9), close_time=time(17))
+
+        stale.name = 'Renamed'
+        stale.save()
+
+        shop = Shop.objects.get(pk=self.shop.pk)
+        self.assertEqual(shop.name, 'Renamed')
+        self.assertGreater(shop.schedule_version, stale.schedule_version)
+        self.assertEqual(get_shop_schedule(shop).business_hours[0], (9 * 60, 17 * 60))
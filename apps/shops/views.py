@@ -1,10 +1,12 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Q
 from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 
 from .forms import BusinessHoursFormSet, ShopClosureForm, ShopForm
 from .models import BusinessHours, Shop, ShopClosure
+from .schedule import get_shop_schedule
 
 
 def get_user_shop(user):
@@ -53,7 +55,7 @@ def shop_dashboard_view(request, slug):
     shop = get_object_or_404(Shop, slug=slug)
 
     # Check ownership
-    if shop.owner != request.user:
+    if shop.owner_id != request.user.pk:
         raise Http404("Shop not found")
 
     # Get stats
@@ -73,7 +75,7 @@ def shop_edit_view(request, slug):
     """Edit shop details."""
     shop = get_object_or_404(Shop, slug=slug)
 
-    if shop.owner != request.user:
+    if shop.owner_id != request.user.pk:
         raise Http404("Shop not found")
 
     if request.method == 'POST':
@@ -93,7 +95,7 @@ def shop_hours_view(request, slug):
     """Edit business hours."""
     shop = get_object_or_404(Shop, slug=slug)
 
-    if shop.owner != request.user:
+    if shop.owner_id != request.user.pk:
         raise Http404("Shop not found")
 
     if request.method == 'POST':
@@ -122,7 +124,7 @@ def shop_closures_view(request, slug):
     """Manage shop closures."""
     shop = get_object_or_404(Shop, slug=slug)
 
-    if shop.owner != request.user:
+    if shop.owner_id != request.user.pk:
         raise Http404("Shop not found")
 
     closures = shop.closures.all()
@@ -150,7 +152,7 @@ def shop_closure_delete_view(request, slug, pk):
     """Delete a shop closure."""
     shop = get_object_or_404(Shop, slug=slug)
 
-    if shop.owner != request.user:
+    if shop.owner_id != request.user.pk:
         raise Http404("Shop not found")
 
     closure = get_object_or_404(ShopClosure, pk=pk, shop=shop)
@@ -166,9 +168,14 @@ def shop_public_view(request, slug):
     """Public view of a shop for customers."""
     shop = get_object_or_404(Shop, slug=slug, is_active=True)
 
-    services = shop.services.filter(is_active=True).select_related('category')
-    staff = shop.staff_members.filter(is_active=True, accepts_bookings=True)
-    hours = shop.business_hours.all()
+    services = shop.services.filter(is_active=True).select_related('category').annotate(
+        staff_count=Count(
+            'staff_members',
+            filter=Q(staff_members__is_active=True, staff_members__accepts_bookings=True),
+        ),
+    )
+    staff = shop.staff_members.filter(is_active=True, accepts_bookings=True).select_related('user')
+    hours = get_shop_schedule(shop).weekly_hours()
 
     return render(request, 'shops/public.html', {
         'shop': shop,
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("staff", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="staff",
+            name="feed_key",
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
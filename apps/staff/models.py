@@ -29,6 +29,9 @@ class Staff(models.Model):
         related_name='staff_members',
     )
 
+    # Signed into calendar feed URLs; changing it revokes the old URL
+    feed_key = models.CharField(max_length=32, blank=True, editable=False)
+
     is_active = models.BooleanField(default=True)
     accepts_bookings = models.BooleanField(default=True)
 
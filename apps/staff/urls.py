@@ -13,4 +13,5 @@ urlpatterns = [
     path('<slug:slug>/<int:pk>/hours/', views.staff_hours_view, name='hours'),
     path('<slug:slug>/<int:pk>/time-off/', views.staff_time_off_view, name='time_off'),
     path('<slug:slug>/<int:pk>/time-off/<int:time_off_pk>/delete/', views.staff_time_off_delete_view, name='time_off_delete'),
+    path('<slug:slug>/<int:pk>/feed/reset/', views.staff_feed_reset_view, name='feed_reset'),
 ]
@@ -1,9 +1,15 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count
 from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
+from django.views.decorators.http import require_POST
 
+from apps.bookings import feeds
+from apps.bookings.models import Booking
 from apps.shops.models import Shop
+from apps.shops.schedule import get_shop_schedule
 
 from .forms import (
     StaffForm,
@@ -17,7 +23,7 @@ from .models import Staff, StaffTimeOff, StaffWorkingHours
 def get_shop_for_user(request, slug):
     """Get shop and verify ownership."""
     shop = get_object_or_404(Shop, slug=slug)
-    if shop.owner != request.user:
+    if shop.owner_id != request.user.pk:
         raise Http404("Shop not found")
     return shop
 
@@ -26,7 +32,19 @@ def get_shop_for_user(request, slug):
 def staff_list_view(request, slug):
     """List all staff for a shop."""
     shop = get_shop_for_user(request, slug)
-    staff_members = shop.staff_members.select_related('user').all()
+    staff_members = list(
+        shop.staff_members.select_related('user').annotate(
+            service_count=Count('staff_services'),
+            upcoming_booking_count=Booking.objects.upcoming().count_per('staff'),
+        )
+    )
+
+    # Today's hours come from the compiled schedule, not a query per row
+    schedule = get_shop_schedule(shop)
+    today = timezone.now().date()
+    for staff in staff_members:
+        staff.today_hours = schedule.staff_day(staff.pk, today)
+        staff.feed_url = feeds.feed_url(request, 'staff', staff)
 
     return render(request, 'staff/list.html', {
         'shop': shop,
@@ -190,3 +208,14 @@ def staff_time_off_delete_view(request, slug, pk, time_off_pk):
         messages.success(request, 'Time off deleted successfully!')
 
     return redirect('staff:time_off', slug=shop.slug, pk=staff.pk)
+
+
+@login_required
+@require_POST
+def staff_feed_reset_view(request, slug, pk):
+    """Replace a staff member's calendar feed URL, revoking the old one."""
+    shop = get_shop_for_user(request, slug)
+    staff = get_object_or_404(Staff, pk=pk, shop=shop)
+    feeds.reset_feed_key(staff)
+    messages.success(request, f'Calendar link of {staff.display_name} reset. Share the new link with them.')
+    return redirect('staff:list', slug=shop.slug)
@@ -4,6 +4,7 @@ Base settings for AppointHub project.
 import os
 from pathlib import Path
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -143,6 +144,35 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'maintain-booking-partitions': {
+        'task': 'apps.bookings.tasks.maintain_booking_partitions',
+        'schedule': crontab(hour=3, minute=15),
+    },
+    'archive-old-bookings': {
+        'task': 'apps.bookings.tasks.archive_old_bookings',
+        'schedule': crontab(hour=3, minute=45),
+    },
+    'reconcile-dashboard-stats': {
+        'task': 'apps.dashboard.tasks.reconcile_dashboard_stats',
+        'schedule': crontab(hour=4, minute=15),
+    },
+}
+
+# Monthly booking partitions on PostgreSQL (see apps/bookings/partitioning.py).
+# Partitions are created this many months ahead, and detached once older
+# than the retention window and the archive cutoff and all their bookings
+# are archived (0 keeps them all).
+BOOKING_PARTITIONING = os.getenv('BOOKING_PARTITIONING', 'False').lower() == 'true'
+BOOKING_PARTITION_MONTHS_AHEAD = 12
+BOOKING_PARTITION_RETENTION_MONTHS = int(os.getenv('BOOKING_PARTITION_RETENTION_MONTHS', '24'))
+
+# Completed, cancelled and no-show bookings older than this move to ArchivedBooking
+BOOKING_ARCHIVE_AFTER_DAYS = int(os.getenv('BOOKING_ARCHIVE_AFTER_DAYS', '365'))
+
+# Days around today whose dashboard rollups are re-derived every night
+DASHBOARD_RECONCILE_PAST_DAYS = 7
+DASHBOARD_RECONCILE_FUTURE_DAYS = 90
 
 # Session settings
 SESSION_COOKIE_AGE = 86400 * 7  # 1 week
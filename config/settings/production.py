@@ -3,6 +3,7 @@ Production settings for AppointHub project.
 """
 import os
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 from .base import *
 
@@ -25,6 +26,19 @@ DATABASES = {
     )
 }
 
+# Cache - must be shared across workers: slot holds, rate limits and the
+# availability and dashboard version stamps are only correct if every
+# worker sees the same keys, which per-process memory cannot give
+REDIS_URL = os.getenv('REDIS_URL')
+if not REDIS_URL:
+    raise ImproperlyConfigured('REDIS_URL must point at the shared Redis cache in production.')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True